@@ -0,0 +1,79 @@
+# Consultas de reportes de ventas. Por defecto leen la tabla ventas_diarias; con
+# fuente "raw" calculan lo mismo sobre los pedidos (activos y archivados, sin los
+# cancelados) para verificación.
+
+FUENTES = {
+    "rollup": """
+        SELECT dia, producto_id, unidades, ingresos
+        FROM ventas_diarias
+        WHERE dia >= ? AND dia <= ?
+    """,
+    # Cada tabla de pedidos con su propio detalle: unir las vistas *_historico cruzaría activos y archivados
+    "raw": " UNION ALL ".join(f"""
+        SELECT substr(p.fecha, 1, 10) AS dia, dp.producto_id,
+               dp.cantidad AS unidades, dp.cantidad * dp.precio_unitario AS ingresos
+        FROM {pedidos} p
+        JOIN {detalles} dp ON dp.pedido_id = p.id
+        WHERE p.fecha >= ?1 AND p.fecha <= ?2 || ' 23:59:59' AND p.estado IS NOT 'Cancelado'
+    """ for pedidos, detalles in (("pedidos", "detalle_pedido"), ("pedidos_archivo", "detalle_pedido_archivo"))),
+}
+
+AGRUPACIONES = {
+    "dia": ("v.dia AS dia", "", "v.dia", "v.dia"),
+    "semana": ("date(v.dia, 'weekday 0', '-6 days') AS semana", "", "semana", "semana"),
+    "producto": (
+        "v.producto_id AS producto_id, pr.nombre AS producto",
+        "LEFT JOIN productos pr ON pr.id = v.producto_id",
+        "v.producto_id",
+        "v.producto_id",
+    ),
+    "categoria": (
+        "pr.categoria_id AS categoria_id, c.nombre AS categoria",
+        "LEFT JOIN productos pr ON pr.id = v.producto_id "
+        "LEFT JOIN categorias c ON c.id = pr.categoria_id",
+        "pr.categoria_id",
+        "pr.categoria_id",
+    ),
+}
+
+FECHA_MINIMA = "0000-00-00"
+FECHA_MAXIMA = "9999-12-31"
+
+
+def _rango(desde, hasta):
+    return (desde or FECHA_MINIMA)[:10], (hasta or FECHA_MAXIMA)[:10]
+
+
+def columnar(cursor):
+    # {"columnas": [...], "datos": [[valores de la columna 1], [valores de la columna 2], ...]}
+    columnas = [descripcion[0] for descripcion in cursor.description]
+    filas = cursor.fetchall()
+    datos = [list(columna) for columna in zip(*filas)] if filas else [[] for _ in columnas]
+    return {"columnas": columnas, "filas": len(filas), "datos": datos}
+
+
+def ventas(conn, agrupar, desde=None, hasta=None, fuente="rollup"):
+    seleccion, joins, grupo, orden = AGRUPACIONES[agrupar]
+    sql = f"""
+        SELECT {seleccion}, SUM(v.unidades) AS unidades, SUM(v.ingresos) AS ingresos
+        FROM ({FUENTES[fuente]}) v
+        {joins}
+        GROUP BY {grupo}
+        HAVING SUM(v.unidades) <> 0
+        ORDER BY {orden}
+    """
+    return columnar(conn.execute(sql, _rango(desde, hasta)))
+
+
+def top_productos(conn, n, desde=None, hasta=None, fuente="rollup", por="unidades"):
+    sql = f"""
+        SELECT v.producto_id AS producto_id, pr.nombre AS producto,
+               SUM(v.unidades) AS unidades, SUM(v.ingresos) AS ingresos
+        FROM ({FUENTES[fuente]}) v
+        LEFT JOIN productos pr ON pr.id = v.producto_id
+        GROUP BY v.producto_id
+        HAVING SUM(v.unidades) > 0
+        ORDER BY {por} DESC, v.producto_id
+        LIMIT ?
+    """
+    return columnar(conn.execute(sql, (*_rango(desde, hasta), n)))
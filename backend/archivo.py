@@ -0,0 +1,57 @@
+import os
+from datetime import datetime, timedelta
+
+import estados
+
+# Pedidos cerrados con más de esta antigüedad pasan a las tablas de archivo
+ANTIGUEDAD_DIAS = int(os.environ.get("FITNESS_ARCHIVE_DAYS", "365"))
+LOTE = 1000
+ARCHIVABLES = (estados.COMPLETADO, estados.CANCELADO)
+
+COLUMNAS_PEDIDO = "id, cliente_id, fecha, total, estado"
+COLUMNAS_DETALLE = "id, pedido_id, producto_id, cantidad, precio_unitario"
+
+
+# Mueve hasta `lote` pedidos en `estado` anteriores a `limite` (con sus líneas) dentro de la
+# transacción del llamador. Se copian antes de borrar: los triggers reconocen las filas ya
+# archivadas y no descuentan nada de los resúmenes.
+def archivar_lote(conn, estado, limite, lote=LOTE):
+    ids = [row[0] for row in conn.execute(
+        "SELECT id FROM pedidos WHERE estado = ? AND fecha < ? LIMIT ?", (estado, limite, lote))]
+    if not ids:
+        return 0
+    marcadores = ", ".join("?" * len(ids))
+    conn.execute(f"""
+        INSERT INTO pedidos_archivo ({COLUMNAS_PEDIDO})
+        SELECT {COLUMNAS_PEDIDO} FROM pedidos WHERE id IN ({marcadores})
+    """, ids)
+    conn.execute(f"""
+        INSERT INTO detalle_pedido_archivo ({COLUMNAS_DETALLE})
+        SELECT {COLUMNAS_DETALLE} FROM detalle_pedido WHERE pedido_id IN ({marcadores})
+    """, ids)
+    conn.execute(f"DELETE FROM detalle_pedido WHERE pedido_id IN ({marcadores})", ids)
+    conn.execute(f"DELETE FROM pedidos WHERE id IN ({marcadores})", ids)
+    return len(ids)
+
+
+# Archiva por lotes, un lote por transacción, para no bloquear a los demás escritores
+def archivar(conn, dias=ANTIGUEDAD_DIAS, lote=LOTE):
+    limite = (datetime.now() - timedelta(days=dias)).strftime("%Y-%m-%d %H:%M:%S")
+    if conn.in_transaction:
+        conn.commit()
+    archivados = 0
+    lotes = 0
+    for estado in ARCHIVABLES:
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                cantidad = archivar_lote(conn, estado, limite, lote)
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+            archivados += cantidad
+            lotes += cantidad > 0
+            if cantidad < lote:
+                break
+    return {"archivados": archivados, "lotes": lotes, "hasta": limite}
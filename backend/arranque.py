@@ -0,0 +1,144 @@
+import asyncio
+import os
+import sqlite3
+import time
+from urllib.parse import urlsplit
+
+import migraciones
+
+# FITNESS_MIGRATE=0 para procesos que no deben tocar el esquema (p. ej. réplicas de solo lectura)
+MIGRAR = os.environ.get("FITNESS_MIGRATE", "1") == "1"
+CALENTAR = os.environ.get("FITNESS_WARMUP", "1") == "1"
+# Filas que examina ANALYZE por índice: acota el arranque en bases grandes
+LIMITE_ANALISIS = int(os.environ.get("FITNESS_ANALYSIS_LIMIT", "1000"))
+
+# Rutas que la app se pide a sí misma antes de declararse lista: llenan la caché del catálogo y
+# las sentencias preparadas de cada conexión del pool
+RUTAS = tuple(ruta for ruta in os.environ.get(
+    "FITNESS_WARMUP_PATHS",
+    "/categorias,/productos,/productos?orden=precio,/clientes,/pedidos,/pedidos/pendientes,/stats",
+).split(",") if ruta)
+
+# Lecturas que traen a memoria las páginas más usadas; con mmap quedan en el caché del sistema
+# operativo, compartido por todas las conexiones
+PAGINAS_CALIENTES = (
+    "SELECT SUM(length(nombre) + length(descripcion) + stock) FROM productos",
+    "SELECT COUNT(*) FROM categorias",
+    "SELECT COUNT(*) FROM pedidos WHERE estado IN ('Pendiente', 'En Proceso')",
+    "SELECT SUM(total) FROM (SELECT total FROM pedidos ORDER BY fecha DESC LIMIT 5000)",
+    "SELECT SUM(total_gastado) FROM resumen_clientes",
+    "SELECT SUM(unidades) FROM ventas_producto",
+)
+
+
+# Estadísticas del planificador: ANALYZE completo la primera vez, después solo PRAGMA optimize
+# (que vuelve a analizar las tablas que cambiaron lo suficiente)
+def optimizar(conn):
+    conn.execute(f"PRAGMA analysis_limit = {LIMITE_ANALISIS}")
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone() is None:
+        conn.execute("ANALYZE")
+    else:
+        conn.execute("PRAGMA optimize")
+    conn.commit()
+
+
+def tocar_paginas(pool):
+    with pool.conexion() as conn:
+        for sql in PAGINAS_CALIENTES:
+            conn.execute(sql).fetchall()
+
+
+async def pedir(app, ruta):
+    # Petición GET hecha directamente a la app ASGI, sin pasar por la red
+    partes = urlsplit(ruta)
+    recibido = False
+    estado = None
+
+    async def receive():
+        nonlocal recibido
+        if not recibido:
+            recibido = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # Este cliente nunca se desconecta; la espera se cancela al terminar la respuesta
+        await asyncio.Future()
+
+    async def send(mensaje):
+        nonlocal estado
+        if mensaje["type"] == "http.response.start":
+            estado = mensaje["status"]
+
+    await app({
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": partes.path,
+        "raw_path": partes.path.encode(),
+        "query_string": partes.query.encode(),
+        "root_path": "",
+        "headers": [(b"host", b"localhost"), (b"accept-encoding", b"gzip")],
+        "client": ("127.0.0.1", 0),
+        "server": ("127.0.0.1", 80),
+    }, receive, send)
+    return estado
+
+
+class Arranque:
+    def __init__(self):
+        self.fase = "iniciando"
+        self.listo = False
+        self.version_esquema = None
+        self.migraciones = []
+        self.rutas = {}
+        self.tiempos = {}
+        self.error = None
+
+    def _medir(self, fase, funcion, *args):
+        self.fase = fase
+        inicio = time.perf_counter()
+        try:
+            return funcion(*args)
+        finally:
+            self.tiempos[fase] = round((time.perf_counter() - inicio) * 1000, 1)
+
+    # Antes de abrir el pool y de aceptar peticiones: sin el esquema al día la app no puede responder
+    def preparar_base(self, ruta):
+        conn = sqlite3.connect(ruta, timeout=migraciones.ESPERA_LOCK)
+        try:
+            if MIGRAR:
+                self.migraciones = self._medir("migraciones", migraciones.migrar, conn)
+            self._medir("estadisticas", optimizar, conn)
+            self.version_esquema = migraciones.version(conn)
+        finally:
+            conn.close()
+
+    # En segundo plano, con la app ya sirviendo: /ready responde 503 hasta que termina
+    async def calentar(self, app, pool, bd):
+        try:
+            if CALENTAR:
+                await bd.ejecutar(self._medir, "paginas", tocar_paginas, pool)
+                self.fase = "rutas"
+                inicio = time.perf_counter()
+                # Una pasada arma la caché del catálogo; la segunda, concurrente, prepara las
+                # sentencias en todas las conexiones del pool
+                for ruta in RUTAS:
+                    self.rutas[ruta] = await pedir(app, ruta)
+                await asyncio.gather(*(pedir(app, ruta) for ruta in RUTAS for _ in range(pool.tamano)))
+                self.tiempos["rutas"] = round((time.perf_counter() - inicio) * 1000, 1)
+        except Exception as e:
+            # El calentamiento es una optimización: si falla, la app igual pasa a estar lista
+            self.error = f"{type(e).__name__}: {e}"
+        self.fase = "lista"
+        self.listo = True
+
+    def estado(self):
+        return {
+            "listo": self.listo,
+            "fase": self.fase,
+            "version_esquema": self.version_esquema,
+            "migraciones": self.migraciones,
+            "rutas": self.rutas,
+            "tiempos_ms": self.tiempos,
+            "error": self.error,
+        }
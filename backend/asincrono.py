@@ -0,0 +1,127 @@
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from db import POOL_SIZE
+
+# Hilos dedicados a SQLite, aparte del threadpool de Starlette (40 por defecto). Con un hilo por
+# conexión del pool, las peticiones de más esperan en la cola del executor sin ocupar hilos.
+HILOS = int(os.environ.get("FITNESS_DB_THREADS", str(POOL_SIZE)))
+
+
+class ClienteDesconectado(Exception):
+    pass
+
+
+# Una consulta en curso: guarda la conexión que está usando para poder interrumpirla
+class _Tarea:
+    def __init__(self, pool, funcion, args):
+        self.pool = pool
+        self.funcion = funcion
+        self.args = args
+        self.conn = None
+        self.cancelada = False
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self.pool.conexion() as conn:
+            with self._lock:
+                if self.cancelada:
+                    # El cliente se fue mientras la tarea esperaba en la cola
+                    raise ClienteDesconectado
+                self.conn = conn
+            try:
+                return self.funcion(conn, *self.args)
+            finally:
+                with self._lock:
+                    self.conn = None
+
+    def interrumpir(self):
+        with self._lock:
+            self.cancelada = True
+            if self.conn is not None:
+                # La sentencia en curso termina con "interrupted" y la conexión vuelve al pool
+                self.conn.interrupt()
+
+
+async def _esperar_desconexion(request):
+    # El cuerpo ya fue leído (o no hay), así que el próximo mensaje solo llega si el cliente se va
+    while True:
+        mensaje = await request.receive()
+        if mensaje["type"] == "http.disconnect":
+            return
+
+
+class EjecutorDB:
+    def __init__(self, pool, hilos=HILOS):
+        self.pool = pool
+        self.hilos = hilos
+        self._ejecutor = None
+        self._lock = threading.Lock()
+        self.en_curso = 0
+        self.completadas = 0
+        self.canceladas = 0
+
+    def iniciar(self):
+        with self._lock:
+            if self._ejecutor is None:
+                self._ejecutor = ThreadPoolExecutor(max_workers=self.hilos, thread_name_prefix="db")
+            return self._ejecutor
+
+    def detener(self):
+        with self._lock:
+            ejecutor, self._ejecutor = self._ejecutor, None
+        if ejecutor is not None:
+            ejecutor.shutdown(wait=True, cancel_futures=True)
+
+    def _en_hilo(self, funcion, *args):
+        # Se copia el contexto para que las métricas por petición sigan viendo su petición
+        contexto = contextvars.copy_context()
+        return asyncio.get_running_loop().run_in_executor(self.iniciar(), contexto.run, funcion, *args)
+
+    async def ejecutar(self, funcion, *args):
+        # Para escrituras: una vez encolada la operación termina aunque la petición se cancele
+        return await asyncio.shield(self._en_hilo(funcion, *args))
+
+    # Ejecuta funcion(conn, *args) en un hilo del executor. Si el cliente se desconecta antes de
+    # la respuesta se interrumpe la consulta y se lanza ClienteDesconectado.
+    async def leer(self, request, funcion, *args):
+        tarea = _Tarea(self.pool, funcion, args)
+        consulta = self._en_hilo(tarea)
+        desconexion = asyncio.ensure_future(_esperar_desconexion(request))
+        self._contar("en_curso", 1)
+        try:
+            await asyncio.wait((consulta, desconexion), return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            tarea.interrumpir()
+            consulta.cancel()
+            raise
+        finally:
+            desconexion.cancel()
+            self._contar("en_curso", -1)
+        if consulta.done():
+            self._contar("completadas", 1)
+            return consulta.result()
+        tarea.interrumpir()
+        # Si todavía estaba en la cola, el executor la descarta sin ejecutarla
+        consulta.cancel()
+        self._contar("canceladas", 1)
+        raise ClienteDesconectado
+
+    def _contar(self, campo, delta):
+        with self._lock:
+            setattr(self, campo, getattr(self, campo) + delta)
+
+    def estadisticas(self):
+        with self._lock:
+            ejecutor = self._ejecutor
+            return {
+                "hilos": self.hilos,
+                "activos": len(ejecutor._threads) if ejecutor is not None else 0,
+                "en_cola": ejecutor._work_queue.qsize() if ejecutor is not None else 0,
+                "en_curso": self.en_curso,
+                "completadas": self.completadas,
+                "canceladas": self.canceladas,
+            }
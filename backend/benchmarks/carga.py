@@ -0,0 +1,251 @@
+# Prueba de carga reproducible del backend: genera una base a escala (init_db.generar_base)
+# en un directorio temporal, levanta la API (en este proceso o con workers de uvicorn) y ejecuta una
+# mezcla de lecturas y escrituras con concurrencia configurable. El reporte JSON
+# incluye el commit para poder comparar corridas.
+#
+#   python benchmarks/carga.py --productos 5000 --clientes 20000 --pedidos 50000 \
+#       --concurrencia 32 --duracion 30 --servidor uvicorn --workers 4 --salida reporte.json
+import argparse
+import contextlib
+import http.client
+import json
+import os
+import random
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from comun import BACKEND, commit_actual, resumen_latencias
+
+sys.path.insert(0, BACKEND)
+
+MEZCLA = {"catalogo": 45, "producto": 30, "checkout": 20, "cancelar": 5}
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def sembrar(ruta, productos, clientes, pedidos, semilla):
+    import init_db
+
+    # El progreso de la generación va a stderr para no mezclarse con el reporte JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        init_db.generar_base(ruta, productos, clientes, pedidos, semilla=semilla, forzar=True)
+    conn = sqlite3.connect(ruta)
+    # Stock de sobra para que los checkouts no fallen por stock
+    conn.execute("UPDATE productos SET stock = 10000000")
+    conn.commit()
+    conn.close()
+    return productos, clientes
+
+
+class ServidorEnHilo:
+    def __init__(self, ruta, puerto, escritor):
+        os.environ["FITNESS_DB"] = ruta
+        os.environ["FITNESS_ORDER_WRITER"] = escritor
+        import uvicorn
+        import main
+
+        self.servidor = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=puerto, log_level="warning"))
+        self.hilo = threading.Thread(target=self.servidor.run, daemon=True)
+
+    def iniciar(self):
+        self.hilo.start()
+
+    def detener(self):
+        self.servidor.should_exit = True
+        self.hilo.join()
+
+
+class ServidorUvicorn:
+    def __init__(self, ruta, puerto, escritor, workers):
+        self.comando = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+                        "--port", str(puerto), "--workers", str(workers), "--log-level", "warning"]
+        self.entorno = {**os.environ, "FITNESS_DB": ruta, "FITNESS_ORDER_WRITER": escritor}
+        self.proceso = None
+
+    def iniciar(self):
+        self.proceso = subprocess.Popen(self.comando, cwd=BACKEND, env=self.entorno)
+
+    def detener(self):
+        self.proceso.terminate()
+        self.proceso.wait(timeout=30)
+
+
+def esperar_servidor(puerto, timeout=30):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", puerto, timeout=2)
+            conn.request("GET", "/ready")
+            if conn.getresponse().status == 200:
+                conn.close()
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("El servidor no respondió a tiempo")
+
+
+class Resultados:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencias = {}
+        self.errores = {}
+        self.bloqueos = 0
+
+    def registrar(self, operacion, duracion, estado, cuerpo):
+        with self.lock:
+            self.latencias.setdefault(operacion, []).append(duracion)
+            if estado is None or estado >= 400:
+                clave = f"{operacion}:{estado}"
+                self.errores[clave] = self.errores.get(clave, 0) + 1
+                if cuerpo and b"database is locked" in cuerpo:
+                    self.bloqueos += 1
+
+
+def trabajador(puerto, semilla, fin_calentamiento, fin, total_productos, total_clientes, resultados):
+    azar = random.Random(semilla)
+    operaciones = list(MEZCLA)
+    pesos = list(MEZCLA.values())
+    conn = http.client.HTTPConnection("127.0.0.1", puerto, timeout=60)
+    propios = []
+    cursor_catalogo = None
+
+    def pedir(metodo, ruta, cuerpo=None):
+        nonlocal conn
+        headers = {"Content-Type": "application/json"} if cuerpo is not None else {}
+        try:
+            conn.request(metodo, ruta, body=cuerpo, headers=headers)
+            respuesta = conn.getresponse()
+            return respuesta.status, respuesta.read(), respuesta.getheader("X-Next-Cursor")
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", puerto, timeout=60)
+            return None, b"", None
+
+    while time.monotonic() < fin:
+        operacion = azar.choices(operaciones, pesos)[0]
+        if operacion == "cancelar" and not propios:
+            operacion = "checkout"
+
+        inicio = time.perf_counter()
+        if operacion == "catalogo":
+            ruta = "/productos?limit=50"
+            if cursor_catalogo and azar.random() < 0.5:
+                ruta += f"&cursor={cursor_catalogo}"
+            elif azar.random() < 0.5:
+                ruta += f"&categoria_id={azar.randint(1, 5)}"
+            estado, cuerpo, cursor_catalogo = pedir("GET", ruta)
+        elif operacion == "producto":
+            # Sesgo hacia los productos de id bajo, como un catálogo con artículos populares
+            producto_id = min(total_productos, int(azar.paretovariate(1.2)))
+            estado, cuerpo, _ = pedir("GET", f"/productos/{producto_id}")
+        elif operacion == "checkout":
+            carrito = [{"producto_id": azar.randint(1, total_productos), "cantidad": azar.randint(1, 3)}
+                       for _ in range(azar.randint(1, 4))]
+            estado, cuerpo, _ = pedir("POST", "/pedidos", json.dumps(
+                {"cliente_id": azar.randint(1, total_clientes), "productos": carrito}))
+            if estado == 200:
+                propios.append(json.loads(cuerpo)["id"])
+        else:
+            estado, cuerpo, _ = pedir("DELETE", f"/pedidos/{propios.pop()}")
+        duracion = time.perf_counter() - inicio
+
+        if time.monotonic() >= fin_calentamiento:
+            resultados.registrar(operacion, duracion, estado, cuerpo)
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga del backend")
+    parser.add_argument("--productos", type=int, default=2000)
+    parser.add_argument("--clientes", type=int, default=5000)
+    parser.add_argument("--pedidos", type=int, default=10000)
+    parser.add_argument("--concurrencia", type=int, default=16)
+    parser.add_argument("--duracion", type=float, default=20, help="segundos medidos")
+    parser.add_argument("--calentamiento", type=float, default=3, help="segundos no medidos al inicio")
+    parser.add_argument("--servidor", choices=("hilo", "uvicorn"), default="hilo")
+    parser.add_argument("--workers", type=int, default=1, help="workers de uvicorn (--servidor uvicorn)")
+    parser.add_argument("--escritor", choices=("directo", "lotes"), default="directo")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--salida", help="archivo donde guardar el reporte JSON")
+    args = parser.parse_args()
+
+    directorio = tempfile.mkdtemp(prefix="fitness-carga-")
+    ruta = os.path.join(directorio, "fitness_store.db")
+    try:
+        inicio_siembra = time.perf_counter()
+        total_productos, total_clientes = sembrar(
+            ruta, args.productos, args.clientes, args.pedidos, args.semilla)
+        tiempo_siembra = time.perf_counter() - inicio_siembra
+
+        puerto = puerto_libre()
+        if args.servidor == "uvicorn":
+            servidor = ServidorUvicorn(ruta, puerto, args.escritor, args.workers)
+        else:
+            servidor = ServidorEnHilo(ruta, puerto, args.escritor)
+        servidor.iniciar()
+        try:
+            esperar_servidor(puerto)
+            resultados = Resultados()
+            ahora = time.monotonic()
+            fin_calentamiento = ahora + args.calentamiento
+            fin = fin_calentamiento + args.duracion
+            hilos = [
+                threading.Thread(target=trabajador, args=(
+                    puerto, args.semilla + i, fin_calentamiento, fin,
+                    total_productos, total_clientes, resultados))
+                for i in range(args.concurrencia)
+            ]
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                hilo.join()
+        finally:
+            servidor.detener()
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    todas = [latencia for latencias in resultados.latencias.values() for latencia in latencias]
+    total_errores = sum(resultados.errores.values())
+    reporte = {
+        "commit": commit_actual(),
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "configuracion": {**vars(args), "mezcla": MEZCLA},
+        "siembra_segundos": round(tiempo_siembra, 2),
+        "total": {
+            "peticiones": len(todas),
+            "rps": round(len(todas) / args.duracion, 1),
+            "tasa_error": round(total_errores / len(todas), 4) if todas else 0.0,
+            "database_locked": resultados.bloqueos,
+            **resumen_latencias(todas),
+        },
+        "operaciones": {
+            operacion: {
+                "peticiones": len(latencias),
+                "rps": round(len(latencias) / args.duracion, 1),
+                **resumen_latencias(latencias),
+            }
+            for operacion, latencias in sorted(resultados.latencias.items())
+        },
+        "errores": resultados.errores,
+    }
+    texto = json.dumps(reporte, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as archivo:
+            archivo.write(texto + "\n")
+    print(texto)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+# Escalado con la concurrencia de rutas que esperan a SQLite (disco lento, locks): compara
+# handlers síncronos en el threadpool de Starlette (40 hilos) contra handlers async sobre el
+# executor dedicado (asincrono.EjecutorDB). Cada consulta lenta duerme --espera ms dentro de
+# SQLite; mientras tanto una sonda mide la latencia de una ruta trivial.
+#
+# Cada valor de --hilos es una configuración: conexiones del pool en ambos modos e hilos del
+# executor en el modo async. Por defecto se mide la de la app (FITNESS_DB_THREADS) y una con
+# tantos hilos como el threadpool de Starlette, donde los dos modos tienen los mismos recursos.
+#
+#   python benchmarks/concurrencia.py --concurrencias 20,40,80,160 --espera 100 --hilos 8,40
+import argparse
+import http.client
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from comun import BACKEND, commit_actual, resumen_latencias
+
+sys.path.insert(0, BACKEND)
+
+from asincrono import HILOS
+
+MODOS = ("sync", "async")
+# Tamaño por defecto del threadpool de Starlette (anyio), donde corren los handlers síncronos
+HILOS_STARLETTE = 40
+
+
+def crear_app(modo, ruta, hilos, espera_ms):
+    from fastapi import FastAPI, Request
+
+    import db
+    from asincrono import EjecutorDB
+
+    class PoolLento(db.PoolConexiones):
+        # espera(ms) simula una lectura que se queda esperando al disco o a un lock
+        def _conectar(self):
+            conn = super()._conectar()
+            conn.create_function("espera", 1, lambda ms: time.sleep(ms / 1000) or 1)
+            return conn
+
+    pool = PoolLento(ruta, tamano=hilos)
+    bd = EjecutorDB(pool, hilos=hilos)
+    app = FastAPI()
+
+    def consultar(conn):
+        return conn.execute("SELECT espera(?) AS ok", (espera_ms,)).fetchone()["ok"]
+
+    if modo == "sync":
+        @app.get("/lenta")
+        def lenta():
+            with pool.conexion() as conn:
+                return {"ok": consultar(conn)}
+
+        @app.get("/trivial")
+        def trivial():
+            return {"ok": True}
+    else:
+        @app.get("/lenta")
+        async def lenta(request: Request):
+            return {"ok": await bd.leer(request, consultar)}
+
+        @app.get("/trivial")
+        async def trivial():
+            return {"ok": True}
+    return app
+
+
+def servir(modo, puerto, ruta, hilos, espera_ms):
+    import uvicorn
+
+    app = crear_app(modo, ruta, hilos, espera_ms)
+    uvicorn.run(app, host="127.0.0.1", port=puerto, log_level="warning", backlog=4096)
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def esperar_puerto(puerto, timeout=30):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        try:
+            socket.create_connection(("127.0.0.1", puerto), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"El servidor no respondió en el puerto {puerto}")
+
+
+def pedir(conexion, ruta):
+    conexion.request("GET", ruta)
+    respuesta = conexion.getresponse()
+    respuesta.read()
+    return respuesta.status
+
+
+def medir(puerto, concurrencia, duracion, intervalo_sonda):
+    fin = time.monotonic() + duracion
+    latencias = []
+    latencias_sonda = []
+    errores = [0]
+    lock = threading.Lock()
+
+    def cliente():
+        conexion = http.client.HTTPConnection("127.0.0.1", puerto, timeout=60)
+        propias = []
+        while time.monotonic() < fin:
+            inicio = time.perf_counter()
+            try:
+                estado = pedir(conexion, "/lenta")
+            except (OSError, http.client.HTTPException):
+                estado = None
+                conexion.close()
+                conexion = http.client.HTTPConnection("127.0.0.1", puerto, timeout=60)
+            if estado == 200:
+                propias.append(time.perf_counter() - inicio)
+            else:
+                with lock:
+                    errores[0] += 1
+        conexion.close()
+        with lock:
+            latencias.extend(propias)
+
+    def sonda():
+        conexion = http.client.HTTPConnection("127.0.0.1", puerto, timeout=60)
+        while time.monotonic() < fin:
+            inicio = time.perf_counter()
+            pedir(conexion, "/trivial")
+            latencias_sonda.append(time.perf_counter() - inicio)
+            time.sleep(intervalo_sonda)
+        conexion.close()
+
+    hilos = [threading.Thread(target=cliente) for _ in range(concurrencia)] + [threading.Thread(target=sonda)]
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    segundos = time.perf_counter() - inicio
+    return {
+        "lenta": {"rps": round(len(latencias) / segundos, 1), "errores": errores[0], **resumen_latencias(latencias)},
+        "trivial": resumen_latencias(latencias_sonda),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de concurrencia: threadpool vs executor dedicado")
+    parser.add_argument("--concurrencias", default="20,40,80,160", help="clientes simultáneos, separados por coma")
+    parser.add_argument("--duracion", type=float, default=10, help="segundos por medición")
+    parser.add_argument("--espera", type=float, default=100, help="ms que tarda cada consulta lenta")
+    parser.add_argument("--hilos", default=f"{HILOS},{HILOS_STARLETTE}",
+                        help="configuraciones a medir, separadas por coma: hilos del executor y conexiones del pool")
+    parser.add_argument("--sonda", type=float, default=0.02, help="segundos entre pedidos de la ruta trivial")
+    parser.add_argument("--servir", choices=MODOS, help=argparse.SUPPRESS)
+    parser.add_argument("--puerto", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.servir:
+        servir(args.servir, args.puerto, args.db, int(args.hilos), args.espera)
+        return
+
+    directorio = tempfile.mkdtemp(prefix="fitness-concurrencia-")
+    ruta = os.path.join(directorio, "bench.db")
+    resultados = {}
+    try:
+        for hilos in (int(valor) for valor in args.hilos.split(",")):
+            resultados[hilos] = {}
+            for modo in MODOS:
+                puerto = puerto_libre()
+                # El servidor corre en otro proceso para que los clientes no le quiten el GIL
+                servidor = subprocess.Popen([
+                    sys.executable, os.path.abspath(__file__), "--servir", modo, "--puerto", str(puerto),
+                    "--db", ruta, "--hilos", str(hilos), "--espera", str(args.espera),
+                ])
+                try:
+                    esperar_puerto(puerto)
+                    resultados[hilos][modo] = {}
+                    for concurrencia in (int(valor) for valor in args.concurrencias.split(",")):
+                        print(f"hilos={hilos} {modo} concurrencia={concurrencia}", file=sys.stderr)
+                        resultados[hilos][modo][concurrencia] = medir(puerto, concurrencia, args.duracion, args.sonda)
+                finally:
+                    servidor.terminate()
+                    servidor.wait()
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    print(json.dumps({
+        "commit": commit_actual(),
+        "configuracion": {key: value for key, value in vars(args).items() if key not in ("servir", "puerto", "db")},
+        "resultados": resultados,
+    }, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# Compara el alta de pedidos concurrente: una transacción por petición contra el
+# escritor agrupado (group commit). Trabaja sobre una copia temporal de la base, migrada.
+# Los pedidos por segundo varían mucho entre corridas; la diferencia que se repite es la
+# latencia de cola (p99), que el escritor agrupado mantiene acotada.
+#
+#   python benchmarks/pedidos.py --hilos 32 --pedidos 2000
+import argparse
+import json
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+from comun import BACKEND, resumen_latencias
+
+sys.path.insert(0, BACKEND)
+
+
+def preparar_base(directorio):
+    import migraciones
+
+    ruta = os.path.join(directorio, "fitness_store.db")
+    shutil.copy(os.path.join(BACKEND, "fitness_store.db"), ruta)
+    # Mismo esquema que la API: cada pedido paga sus triggers (resúmenes, registro de cambios, catálogo)
+    migraciones.migrar_base(ruta)
+    conn = sqlite3.connect(ruta)
+    conn.execute("UPDATE productos SET stock = 1000000000")
+    conn.commit()
+    conn.close()
+    return ruta
+
+
+def correr(modo, ruta, hilos, total):
+    import db
+    from escritor import EscritorAgrupado
+    from main import PedidoCreate, registrar_pedido
+
+    pool = db.PoolConexiones(ruta, tamano=hilos)
+    escritor = EscritorAgrupado(pool) if modo == "lotes" else None
+    if escritor is not None:
+        escritor.iniciar()
+
+    with pool.conexion() as conn:
+        productos = [row[0] for row in conn.execute("SELECT id FROM productos")]
+        clientes = [row[0] for row in conn.execute("SELECT id FROM clientes")]
+
+    latencias = []
+    errores = {}
+    bloqueos = 0
+    lock = threading.Lock()
+    restantes = [total]
+
+    def trabajador(semilla):
+        nonlocal bloqueos
+        azar = random.Random(semilla)
+        while True:
+            with lock:
+                if restantes[0] <= 0:
+                    return
+                restantes[0] -= 1
+            pedido = PedidoCreate(
+                cliente_id=azar.choice(clientes),
+                productos=[{"producto_id": azar.choice(productos), "cantidad": azar.randint(1, 3)}
+                           for _ in range(azar.randint(1, 4))],
+            )
+            inicio = time.perf_counter()
+            try:
+                if escritor is not None:
+                    escritor.ejecutar(lambda conn: registrar_pedido(conn, pedido))
+                else:
+                    with pool.transaccion() as conn:
+                        registrar_pedido(conn, pedido)
+            except Exception as e:
+                with lock:
+                    nombre = type(e).__name__
+                    errores[nombre] = errores.get(nombre, 0) + 1
+                    if "locked" in str(e):
+                        bloqueos += 1
+                continue
+            with lock:
+                latencias.append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    trabajadores = [threading.Thread(target=trabajador, args=(i,)) for i in range(hilos)]
+    for t in trabajadores:
+        t.start()
+    for t in trabajadores:
+        t.join()
+    duracion = time.perf_counter() - inicio
+
+    if escritor is not None:
+        escritor.detener()
+    pool.cerrar()
+
+    return {
+        "modo": modo,
+        "pedidos_ok": len(latencias),
+        "errores": errores,
+        "database_locked": bloqueos,
+        "pedidos_por_segundo": round(len(latencias) / duracion, 1),
+        **resumen_latencias(latencias),
+        **({"escritor": escritor.estadisticas()} if escritor is not None else {}),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de alta de pedidos")
+    parser.add_argument("--hilos", type=int, default=32)
+    parser.add_argument("--pedidos", type=int, default=2000)
+    args = parser.parse_args()
+
+    resultados = []
+    for modo in ("directo", "lotes"):
+        directorio = tempfile.mkdtemp()
+        try:
+            ruta = preparar_base(directorio)
+            resultados.append(correr(modo, ruta, args.hilos, args.pedidos))
+        finally:
+            shutil.rmtree(directorio, ignore_errors=True)
+    print(json.dumps(resultados, indent=2))
+
+
+if __name__ == "__main__":
+    main()
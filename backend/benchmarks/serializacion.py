@@ -0,0 +1,134 @@
+# Compara la serialización de los listados: filas -> dict -> jsonable_encoder -> json (ruta
+# anterior) contra json_object en SQLite con los bytes enviados tal cual, con y sin ?fields=.
+# Trabaja sobre una base generada en un directorio temporal.
+#
+#   python benchmarks/serializacion.py --productos 20000 --clientes 50000 --pedidos 50000
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from comun import BACKEND, commit_actual
+
+sys.path.insert(0, BACKEND)
+
+PROYECCIONES = {
+    "productos": "id,nombre,precio,stock",
+    "clientes": "id,nombre,email",
+    "pedidos": "id,fecha,total,estado",
+}
+
+
+def consultas():
+    from paginacion import ConsultaPaginada
+
+    return {
+        "productos": (ConsultaPaginada("""
+            SELECT p.*, c.nombre as categoria_nombre
+            FROM productos p
+            LEFT JOIN categorias c ON p.categoria_id = c.id
+        """, {"id": "p.id", "precio": "p.precio"}, "p.id"), "precio"),
+        "clientes": (ConsultaPaginada("SELECT * FROM clientes", {"id": "id"}, "id"), "id"),
+        "pedidos": (ConsultaPaginada("""
+            SELECT p.*, c.nombre as cliente_nombre, c.email as cliente_email
+            FROM pedidos p
+            LEFT JOIN clientes c ON p.cliente_id = c.id
+        """, {"fecha": "p.fecha"}, "p.id"), "fecha"),
+    }
+
+
+def recorrer(pool, funcion, paginas):
+    # Recorre `paginas` páginas consecutivas siguiendo el cursor; devuelve (segundos, filas, bytes)
+    inicio = time.perf_counter()
+    filas = 0
+    tamano = 0
+    cursor = None
+    with pool.conexion() as conn:
+        for _ in range(paginas):
+            cuerpo, cantidad, cursor = funcion(conn, cursor)
+            filas += cantidad
+            tamano += len(cuerpo)
+            if cursor is None:
+                break
+    return time.perf_counter() - inicio, filas, tamano
+
+
+def medir(pool, limite, paginas, repeticiones):
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    from main import CAMPOS_CLIENTE, CAMPOS_PEDIDO, CAMPOS_PRODUCTO, proyeccion
+
+    campos = {"productos": CAMPOS_PRODUCTO, "clientes": CAMPOS_CLIENTE, "pedidos": CAMPOS_PEDIDO}
+    resultados = {}
+    for tabla, (consulta, orden) in consultas().items():
+        def antes(conn, cursor):
+            filas, siguiente = consulta.ejecutar(conn, orden, False, limite, cursor)
+            cuerpo = JSONResponse(jsonable_encoder([dict(fila) for fila in filas])).body
+            return cuerpo, len(filas), siguiente
+
+        def con_campos(seleccion):
+            def despues(conn, cursor):
+                cuerpo, siguiente = consulta.ejecutar_json(conn, orden, False, limite, cursor, seleccion)
+                # Solo la última página puede venir incompleta; contarla no entra en el uso normal
+                return cuerpo, limite if siguiente else len(json.loads(cuerpo)), siguiente
+            return despues
+
+        variantes = {
+            "antes": antes,
+            "json_object": con_campos(campos[tabla]),
+            "json_object_fields": con_campos(proyeccion(PROYECCIONES[tabla], campos[tabla])),
+        }
+        resultados[tabla] = {}
+        for nombre, funcion in variantes.items():
+            recorrer(pool, funcion, 2)
+            mejor = min((recorrer(pool, funcion, paginas) for _ in range(repeticiones)), key=lambda r: r[0])
+            segundos, filas, tamano = mejor
+            resultados[tabla][nombre] = {
+                "filas_por_s": round(filas / segundos),
+                "paginas_por_s": round(filas / limite / segundos, 1),
+                "bytes_por_fila": round(tamano / filas, 1) if filas else 0,
+            }
+        base = resultados[tabla]["antes"]["filas_por_s"]
+        for nombre in ("json_object", "json_object_fields"):
+            resultados[tabla][nombre]["aceleracion"] = round(resultados[tabla][nombre]["filas_por_s"] / base, 2)
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de serialización de listados")
+    parser.add_argument("--productos", type=int, default=20000)
+    parser.add_argument("--clientes", type=int, default=50000)
+    parser.add_argument("--pedidos", type=int, default=50000)
+    parser.add_argument("--limite", type=int, default=500, help="filas por página")
+    parser.add_argument("--paginas", type=int, default=40, help="páginas recorridas por medición")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    directorio = tempfile.mkdtemp(prefix="fitness-serializacion-")
+    ruta = os.path.join(directorio, "fitness_store.db")
+    try:
+        import init_db
+
+        with contextlib.redirect_stdout(sys.stderr):
+            init_db.generar_base(ruta, args.productos, args.clientes, args.pedidos, forzar=True)
+        import db
+
+        pool = db.PoolConexiones(ruta, tamano=1)
+        resultados = medir(pool, args.limite, args.paginas, args.repeticiones)
+        pool.cerrar()
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    print(json.dumps({
+        "commit": commit_actual(),
+        "configuracion": vars(args),
+        "resultados": resultados,
+    }, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+import re
+
+# Palabras de la consulta; la puntuación y los operadores FTS5 se descartan
+PALABRA = re.compile(r"\w+", re.UNICODE)
+
+# Peso relativo de las columnas (nombre, descripcion) en el ranking bm25
+PESOS = (10.0, 1.0)
+
+
+def consulta_fts(texto):
+    # Cada término se cita para que no se interprete como sintaxis FTS5 y el último
+    # se busca por prefijo para autocompletar mientras se escribe
+    terminos = PALABRA.findall(texto)
+    if not terminos:
+        return None
+    citados = ['"%s"' % termino for termino in terminos]
+    citados[-1] += "*"
+    return " ".join(citados)
@@ -0,0 +1,102 @@
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+from starlette.responses import Response
+
+# Por debajo de este tamaño comprimir no compensa
+GZIP_MINIMO = 512
+MAX_ENTRADAS = 256
+
+
+class EntradaCache:
+    def __init__(self, version, cuerpo, headers):
+        self.version = version
+        self.cuerpo = cuerpo
+        self.cuerpo_gzip = gzip.compress(cuerpo, 6) if len(cuerpo) >= GZIP_MINIMO else None
+        self.headers = headers
+        huella = hashlib.blake2b(cuerpo, digest_size=8).hexdigest()
+        # ETag fuerte distinto para cada codificación del mismo contenido
+        self.etag = f'"{version}-{huella}"'
+        self.etag_gzip = f'"{version}-{huella}-gz"'
+
+    def coincide(self, if_none_match):
+        if not if_none_match:
+            return False
+        etiquetas = {etiqueta.strip().removeprefix("W/") for etiqueta in if_none_match.split(",")}
+        return "*" in etiquetas or self.etag in etiquetas or self.etag_gzip in etiquetas
+
+    def respuesta(self, request):
+        usar_gzip = self.cuerpo_gzip is not None and "gzip" in request.headers.get("accept-encoding", "")
+        headers = dict(self.headers)
+        headers["ETag"] = self.etag_gzip if usar_gzip else self.etag
+        # El navegador revalida siempre, pero la revalidación es un 304 sin cuerpo
+        headers["Cache-Control"] = "no-cache"
+        headers["Vary"] = "Accept-Encoding"
+
+        if self.coincide(request.headers.get("if-none-match")):
+            return Response(status_code=304, headers=headers)
+        if usar_gzip:
+            headers["Content-Encoding"] = "gzip"
+            return Response(self.cuerpo_gzip, media_type="application/json", headers=headers)
+        return Response(self.cuerpo, media_type="application/json", headers=headers)
+
+
+class CacheCatalogo:
+    def __init__(self, max_entradas=MAX_ENTRADAS):
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    @staticmethod
+    def version(conn):
+        # La fila la mantienen los triggers, así que también refleja escrituras de otros procesos
+        return conn.execute("SELECT version FROM catalogo_version WHERE id = 1").fetchone()[0]
+
+    def obtener(self, clave, version):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None or entrada.version != version:
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return entrada
+
+    def guardar(self, clave, version, datos, headers=None):
+        # Los datos pueden llegar ya codificados (bytes) desde la ruta rápida de SQLite
+        if isinstance(datos, bytes):
+            cuerpo = datos
+        else:
+            cuerpo = json.dumps(datos, ensure_ascii=False, separators=(",", ":")).encode()
+        entrada = EntradaCache(version, cuerpo, headers or {})
+        with self._lock:
+            self._entradas[clave] = entrada
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+        return entrada
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "entradas": len(self._entradas),
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+            }
+
+
+catalogo = CacheCatalogo()
+
+
+def clave_request(request):
+    return request.url.path + "?" + urlencode(sorted(request.query_params.multi_items()))
@@ -0,0 +1,174 @@
+import os
+import threading
+import time
+
+LIMITE_POR_DEFECTO = 500
+LIMITE_MAXIMO = 5000
+# Entradas que se conservan al compactar; un cliente más atrasado debe resincronizar
+RETENCION = int(os.environ.get("FITNESS_CHANGES_RETENTION", "100000"))
+INTERVALO_COMPACTACION = float(os.environ.get("FITNESS_CHANGES_COMPACT_S", "60"))
+
+# Cómo se lee la fila actual de cada tabla; mismas columnas que los endpoints de listado
+CONSULTAS_FILAS = {
+    "categorias": "SELECT * FROM categorias WHERE id IN ({})",
+    "productos": """
+        SELECT p.*, c.nombre as categoria_nombre
+        FROM productos p
+        LEFT JOIN categorias c ON p.categoria_id = c.id
+        WHERE p.id IN ({})
+    """,
+    "clientes": "SELECT * FROM clientes WHERE id IN ({})",
+    "pedidos": """
+        SELECT p.*, c.nombre as cliente_nombre, c.email as cliente_email
+        FROM pedidos p
+        LEFT JOIN clientes c ON p.cliente_id = c.id
+        WHERE p.id IN ({})
+    """,
+}
+TABLAS = tuple(CONSULTAS_FILAS)
+
+
+def estado(conn):
+    compactado, = conn.execute("SELECT compactado_hasta FROM cambios_estado WHERE id = 1").fetchone()
+    ultimo, = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM cambios").fetchone()
+    # Si el log quedó vacío tras compactar, el último seq emitido sigue siendo el compactado
+    return compactado, max(ultimo, compactado)
+
+
+# Cambios posteriores a `desde`, con una entrada por fila (la más reciente) y su contenido actual.
+# Las filas se devuelven ordenadas por el seq de su último cambio, por lo que `seq` de la
+# respuesta sirve como próximo `desde` aunque el resultado se haya cortado en `limite`.
+def leer(conn, desde, limite=LIMITE_POR_DEFECTO, tablas=TABLAS):
+    # Una transacción de lectura da una misma instantánea para el log y las filas
+    conn.execute("BEGIN")
+    try:
+        compactado, ultimo = estado(conn)
+        if desde < compactado or desde > ultimo:
+            return {"resync": True, "seq": ultimo, "cambios": [], "mas": False}
+
+        marcadores = ", ".join("?" * len(tablas))
+        entradas = conn.execute(f"""
+            SELECT tabla, fila_id, MAX(seq) AS seq, operacion
+            FROM cambios
+            WHERE seq > ? AND tabla IN ({marcadores})
+            GROUP BY tabla, fila_id
+            ORDER BY seq
+            LIMIT ?
+        """, (desde, *tablas, limite + 1)).fetchall()
+        mas = len(entradas) > limite
+        entradas = entradas[:limite]
+
+        ids = {}
+        for entrada in entradas:
+            if entrada["operacion"] not in ("delete", "archive"):
+                ids.setdefault(entrada["tabla"], []).append(entrada["fila_id"])
+        filas = {}
+        for tabla, lista in ids.items():
+            for fila in conn.execute(CONSULTAS_FILAS[tabla].format(", ".join("?" * len(lista))), lista):
+                filas[(tabla, fila["id"])] = dict(fila)
+    finally:
+        conn.rollback()
+
+    resultado = []
+    for entrada in entradas:
+        datos = filas.get((entrada["tabla"], entrada["fila_id"]))
+        if datos is not None:
+            operacion = "upsert"
+        else:
+            # Un pedido archivado sigue en el historial: el cliente lo distingue de una baja
+            operacion = "archive" if entrada["operacion"] == "archive" else "delete"
+        cambio = {
+            "seq": entrada["seq"],
+            "tabla": entrada["tabla"],
+            "id": entrada["fila_id"],
+            "operacion": operacion,
+        }
+        if datos is not None:
+            cambio["datos"] = datos
+        resultado.append(cambio)
+    # Sin más páginas el cliente queda al día con el último seq, aunque sea de otras tablas
+    seq = resultado[-1]["seq"] if mas else max(ultimo, desde)
+    return {"resync": False, "seq": seq, "cambios": resultado, "mas": mas}
+
+
+# Compactación en dos pasos:
+#  1. elimina las entradas reemplazadas por un cambio posterior de la misma fila (seguro para
+#     cualquier cliente, porque recibirá el cambio más nuevo);
+#  2. descarta lo que excede la retención y avanza compactado_hasta.
+def compactar(conn, retener=RETENCION):
+    revisado, = conn.execute("SELECT revisado_hasta FROM cambios_estado WHERE id = 1").fetchone()
+    compactado, ultimo = estado(conn)
+    reemplazadas = conn.execute("""
+        DELETE FROM cambios WHERE seq IN (
+            SELECT anterior.seq
+            FROM cambios nuevo
+            JOIN cambios anterior ON anterior.tabla = nuevo.tabla
+                                 AND anterior.fila_id = nuevo.fila_id
+                                 AND anterior.seq < nuevo.seq
+            WHERE nuevo.seq > ?
+        )
+    """, (revisado,)).rowcount
+    descartadas = 0
+    tope = ultimo - retener
+    if tope > compactado:
+        descartadas = conn.execute("DELETE FROM cambios WHERE seq <= ?", (tope,)).rowcount
+        compactado = tope
+    conn.execute("UPDATE cambios_estado SET compactado_hasta = ?, revisado_hasta = ? WHERE id = 1",
+                 (compactado, ultimo))
+    return {"reemplazadas": reemplazadas, "descartadas": descartadas, "compactado_hasta": compactado}
+
+
+# Último seq con una caché breve: los streams SSE consultan seguido y casi nunca hay novedades
+class VigiaCambios:
+    def __init__(self, pool, vigencia=0.25):
+        self.pool = pool
+        self.vigencia = vigencia
+        self._lock = threading.Lock()
+        self._ultimo = 0
+        self._leido = 0.0
+
+    def ultimo(self):
+        with self._lock:
+            if time.monotonic() - self._leido < self.vigencia:
+                return self._ultimo
+        with self.pool.conexion() as conn:
+            _, ultimo = estado(conn)
+        with self._lock:
+            self._ultimo = ultimo
+            self._leido = time.monotonic()
+        return ultimo
+
+
+class CompactadorCambios:
+    def __init__(self, pool, retener=RETENCION, intervalo=INTERVALO_COMPACTACION):
+        self.pool = pool
+        self.retener = retener
+        self.intervalo = intervalo
+        self._detener = threading.Event()
+        self._hilo = None
+        self.ultima = None
+
+    def iniciar(self):
+        if self._hilo is None and self.intervalo > 0:
+            self._detener.clear()
+            self._hilo = threading.Thread(target=self._bucle, name="compactador-cambios", daemon=True)
+            self._hilo.start()
+
+    def detener(self):
+        if self._hilo is not None:
+            self._detener.set()
+            self._hilo.join()
+            self._hilo = None
+
+    def ejecutar(self):
+        with self.pool.transaccion() as conn:
+            self.ultima = compactar(conn, self.retener)
+        return self.ultima
+
+    def _bucle(self):
+        while not self._detener.wait(self.intervalo):
+            try:
+                self.ejecutar()
+            except Exception:
+                # Se reintenta en el próximo intervalo (p. ej. si la base estaba bloqueada)
+                pass
@@ -0,0 +1,167 @@
+import os
+import threading
+
+import cambios
+
+# Cada cuánto se aplican al snapshot los cambios de productos registrados en el log
+INTERVALO_REFRESCO_MS = float(os.environ.get("FITNESS_QUOTE_REFRESH_MS", "100"))
+
+
+class Snapshot:
+    __slots__ = ("version", "seq", "productos")
+
+    def __init__(self, version, seq, productos):
+        self.version = version
+        self.seq = seq
+        # id -> (precio, stock)
+        self.productos = productos
+
+
+# Precios y stock de todos los productos en memoria. Las cotizaciones leen la referencia al
+# snapshot actual sin tocar SQLite ni tomar locks; el refresco arma un snapshot nuevo
+# (copy-on-write) y lo publica con una sola asignación.
+class SnapshotCatalogo:
+    def __init__(self, pool, intervalo_ms=INTERVALO_REFRESCO_MS):
+        self.pool = pool
+        self.intervalo = intervalo_ms / 1000
+        self.actual = None
+        self._lock = threading.Lock()
+        self._aviso = threading.Event()
+        self._detener = threading.Event()
+        self._hilo = None
+        self.recargas = 0
+        self.refrescos = 0
+
+    def _leer_estado(self, conn):
+        version = conn.execute("SELECT version FROM catalogo_version WHERE id = 1").fetchone()[0]
+        compactado, seq = cambios.estado(conn)
+        return version, compactado, seq
+
+    def _recargar(self, conn):
+        version, _, seq = self._leer_estado(conn)
+        productos = {row[0]: (row[1], row[2]) for row in conn.execute("SELECT id, precio, stock FROM productos")}
+        self.recargas += 1
+        return Snapshot(version, seq, productos)
+
+    def _aplicar_cambios(self, conn, anterior):
+        version, compactado, seq = self._leer_estado(conn)
+        if version == anterior.version and seq == anterior.seq:
+            return anterior
+        # Si el log ya no tiene todo lo posterior al snapshot, se recarga completo
+        if anterior.seq < compactado:
+            return self._recargar(conn)
+        modificados = conn.execute("""
+            SELECT c.fila_id, p.precio, p.stock
+            FROM (SELECT DISTINCT fila_id FROM cambios
+                  WHERE seq > ? AND seq <= ? AND tabla = 'productos') c
+            LEFT JOIN productos p ON p.id = c.fila_id
+        """, (anterior.seq, seq)).fetchall()
+        if not modificados:
+            return Snapshot(version, seq, anterior.productos)
+        productos = dict(anterior.productos)
+        for row in modificados:
+            if row[1] is None:
+                productos.pop(row[0], None)
+            else:
+                productos[row[0]] = (row[1], row[2])
+        self.refrescos += 1
+        return Snapshot(version, seq, productos)
+
+    def refrescar(self):
+        with self._lock, self.pool.conexion() as conn:
+            # Versión, log y filas se leen en la misma transacción para que sean coherentes
+            conn.execute("BEGIN")
+            try:
+                if self.actual is None:
+                    self.actual = self._recargar(conn)
+                else:
+                    self.actual = self._aplicar_cambios(conn, self.actual)
+            finally:
+                conn.rollback()
+        return self.actual
+
+    def avisar(self):
+        # Llamado tras una escritura propia: adelanta el próximo refresco sin esperarlo
+        self._aviso.set()
+
+    def iniciar(self):
+        self.refrescar()
+        if self._hilo is None and self.intervalo > 0:
+            self._detener.clear()
+            self._hilo = threading.Thread(target=self._bucle, name="snapshot-catalogo", daemon=True)
+            self._hilo.start()
+
+    def detener(self):
+        if self._hilo is not None:
+            self._detener.set()
+            self._aviso.set()
+            self._hilo.join()
+            self._hilo = None
+
+    def _bucle(self):
+        while not self._detener.is_set():
+            self._aviso.wait(self.intervalo)
+            self._aviso.clear()
+            if self._detener.is_set():
+                break
+            try:
+                self.refrescar()
+            except Exception:
+                # Base bloqueada u otro error transitorio: se reintenta en el próximo ciclo
+                pass
+
+    def productos_en(self, version, ids):
+        # Precios y stock de `ids` si el snapshot corresponde exactamente a `version`
+        snapshot = self.actual
+        if snapshot is None or snapshot.version != version:
+            return None
+        productos = {}
+        for producto_id in ids:
+            datos = snapshot.productos.get(producto_id)
+            if datos is not None:
+                productos[producto_id] = {"id": producto_id, "precio": datos[0], "stock": datos[1]}
+        return productos
+
+    def cotizar(self, cantidades):
+        snapshot = self.actual
+        if snapshot is None:
+            snapshot = self.refrescar()
+        lineas = []
+        errores = []
+        total = 0
+        for producto_id, cantidad in cantidades.items():
+            datos = snapshot.productos.get(producto_id)
+            if datos is None:
+                errores.append({"producto_id": producto_id, "error": "Producto no encontrado"})
+                continue
+            precio, stock = datos
+            subtotal = precio * cantidad
+            linea = {
+                "producto_id": producto_id,
+                "cantidad": cantidad,
+                "precio_unitario": precio,
+                "subtotal": subtotal,
+                "stock_disponible": stock,
+                "disponible": stock >= cantidad,
+            }
+            if not linea["disponible"]:
+                errores.append({"producto_id": producto_id, "error": "Stock insuficiente"})
+            total += subtotal
+            lineas.append(linea)
+        return {
+            "version": snapshot.version,
+            "valido": not errores,
+            "total": total,
+            "lineas": lineas,
+            "errores": errores,
+        }
+
+    def estadisticas(self):
+        snapshot = self.actual
+        return {
+            "version": snapshot.version if snapshot else None,
+            "seq": snapshot.seq if snapshot else None,
+            "productos": len(snapshot.productos) if snapshot else 0,
+            "recargas": self.recargas,
+            "refrescos": self.refrescos,
+        }
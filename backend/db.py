@@ -0,0 +1,200 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from queue import LifoQueue, Empty
+
+import metricas
+
+DB_PATH = os.environ.get("FITNESS_DB", "fitness_store.db")
+POOL_SIZE = int(os.environ.get("FITNESS_DB_POOL_SIZE", "8"))
+POOL_TIMEOUT = float(os.environ.get("FITNESS_DB_POOL_TIMEOUT", "10"))
+
+# Configuración aplicada una sola vez a cada conexión al abrirla
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA cache_size = -65536",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA temp_store = MEMORY",
+)
+
+# Sentencias preparadas que sqlite3 mantiene en caché por conexión
+STATEMENT_CACHE = 256
+
+
+class PoolAgotado(Exception):
+    pass
+
+
+class PoolConexiones:
+    def __init__(self, ruta, tamano=POOL_SIZE, timeout=POOL_TIMEOUT):
+        self.ruta = ruta
+        self.tamano = tamano
+        self.timeout = timeout
+        # LIFO: la conexión devuelta más recientemente tiene la caché más caliente
+        self._libres = LifoQueue()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._creadas = 0
+        self._checkouts = 0
+        self._esperas = 0
+        self._tiempo_espera = 0.0
+        self._timeouts = 0
+
+    def _conectar(self):
+        conn = sqlite3.connect(
+            self.ruta,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE,
+            factory=metricas.ConexionInstrumentada if metricas.HABILITADAS else sqlite3.Connection,
+        )
+        conn.row_factory = sqlite3.Row
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def abrir(self, cantidad=None):
+        # Abre conexiones por adelantado para que las primeras peticiones no paguen el costo
+        cantidad = self.tamano if cantidad is None else min(cantidad, self.tamano)
+        while True:
+            with self._lock:
+                if self._creadas >= cantidad:
+                    return
+                self._creadas += 1
+            try:
+                self._libres.put(self._conectar())
+            except Exception:
+                with self._lock:
+                    self._creadas -= 1
+                raise
+
+    def _tomar(self):
+        try:
+            return self._libres.get_nowait()
+        except Empty:
+            pass
+
+        with self._lock:
+            crear = self._creadas < self.tamano
+            if crear:
+                self._creadas += 1
+        if crear:
+            try:
+                return self._conectar()
+            except Exception:
+                with self._lock:
+                    self._creadas -= 1
+                raise
+
+        inicio = time.perf_counter()
+        try:
+            conn = self._libres.get(timeout=self.timeout)
+        except Empty:
+            with self._lock:
+                self._esperas += 1
+                self._timeouts += 1
+                self._tiempo_espera += time.perf_counter() - inicio
+            raise PoolAgotado("No hay conexiones disponibles en el pool")
+        with self._lock:
+            self._esperas += 1
+            self._tiempo_espera += time.perf_counter() - inicio
+        return conn
+
+    def _devolver(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        self._libres.put(conn)
+
+    @contextmanager
+    def conexion(self):
+        # Un mismo hilo que ya tiene una conexión la reutiliza en lugar de pedir otra
+        actual = getattr(self._local, "conn", None)
+        if actual is not None:
+            self._local.profundidad += 1
+            try:
+                yield actual
+            finally:
+                self._local.profundidad -= 1
+            return
+
+        conn = self._tomar()
+        with self._lock:
+            self._checkouts += 1
+        self._local.conn = conn
+        self._local.profundidad = 1
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._local.profundidad = 0
+            self._devolver(conn)
+
+    @contextmanager
+    def conexion_exclusiva(self):
+        # Para generadores que avanzan desde distintos hilos (respuestas en streaming):
+        # la conexión no queda asociada al hilo que la pidió
+        conn = self._tomar()
+        with self._lock:
+            self._checkouts += 1
+        try:
+            yield conn
+        finally:
+            self._devolver(conn)
+
+    @contextmanager
+    def transaccion(self):
+        # BEGIN IMMEDIATE toma el lock de escritura al inicio y evita upgrades fallidos
+        with self.conexion() as conn:
+            if conn.in_transaction:
+                yield conn
+                return
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+    def cerrar(self):
+        while True:
+            try:
+                conn = self._libres.get_nowait()
+            except Empty:
+                break
+            # Antes de cerrar, como recomienda SQLite: reanaliza las tablas que las consultas de
+            # esta conexión mostraron desactualizadas
+            try:
+                conn.execute("PRAGMA optimize")
+            except sqlite3.Error:
+                pass
+            conn.close()
+            with self._lock:
+                self._creadas -= 1
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "tamano": self.tamano,
+                "creadas": self._creadas,
+                "libres": self._libres.qsize(),
+                "en_uso": self._creadas - self._libres.qsize(),
+                "checkouts": self._checkouts,
+                "esperas": self._esperas,
+                "timeouts": self._timeouts,
+                "tiempo_espera_ms": round(self._tiempo_espera * 1000, 3),
+            }
+
+
+pool = PoolConexiones(DB_PATH)
+
+
+def get_db():
+    return pool.conexion()
+
+
+def transaccion():
+    return pool.transaccion()
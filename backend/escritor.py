@@ -0,0 +1,128 @@
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from queue import Queue, Empty
+
+MAX_LOTE = 64
+MAX_ESPERA_MS = 2.0
+
+_FIN = object()
+
+
+# Un único hilo escritor agrupa las operaciones encoladas en una transacción por lote.
+# Cada operación corre dentro de su propio SAVEPOINT: si falla, solo se deshace ella.
+class EscritorAgrupado:
+    def __init__(self, pool, max_lote=MAX_LOTE, max_espera_ms=MAX_ESPERA_MS):
+        self.pool = pool
+        self.max_lote = max_lote
+        self.max_espera = max_espera_ms / 1000
+        self._cola = Queue()
+        self._hilo = None
+        self._lock = threading.Lock()
+        self._lotes = 0
+        self._operaciones = 0
+        self._fallidas = 0
+        self._tiempo_lotes = 0.0
+
+    def iniciar(self):
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._bucle, name="escritor-pedidos", daemon=True)
+            self._hilo.start()
+
+    def detener(self):
+        if self._hilo is not None:
+            self._cola.put(_FIN)
+            self._hilo.join()
+            self._hilo = None
+
+    def enviar(self, operacion):
+        futuro = Future()
+        self._cola.put((operacion, futuro))
+        return futuro
+
+    def ejecutar(self, operacion):
+        return self.enviar(operacion).result()
+
+    def _bucle(self):
+        terminar = False
+        while not terminar:
+            primero = self._cola.get()
+            if primero is _FIN:
+                break
+            lote = [primero]
+            limite = time.monotonic() + self.max_espera
+            while len(lote) < self.max_lote:
+                restante = limite - time.monotonic()
+                try:
+                    siguiente = self._cola.get(timeout=restante) if restante > 0 else self._cola.get_nowait()
+                except Empty:
+                    break
+                if siguiente is _FIN:
+                    terminar = True
+                    break
+                lote.append(siguiente)
+            try:
+                self._procesar(lote)
+            except Exception as e:
+                # Un error inesperado no debe detener el hilo ni dejar clientes esperando
+                for _, futuro in lote:
+                    if not futuro.done():
+                        futuro.set_exception(e)
+
+    def _procesar(self, lote):
+        inicio = time.perf_counter()
+        resultados = []
+        with self.pool.conexion() as conn:
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+            except sqlite3.Error as e:
+                for _, futuro in lote:
+                    futuro.set_exception(e)
+                return
+
+            for operacion, futuro in lote:
+                conn.execute("SAVEPOINT operacion")
+                try:
+                    resultado = operacion(conn)
+                except Exception as e:
+                    conn.execute("ROLLBACK TO operacion")
+                    conn.execute("RELEASE operacion")
+                    resultados.append((futuro, None, e))
+                else:
+                    conn.execute("RELEASE operacion")
+                    resultados.append((futuro, resultado, None))
+
+            try:
+                conn.commit()
+            except sqlite3.Error as e:
+                conn.rollback()
+                for _, futuro in lote:
+                    futuro.set_exception(e)
+                return
+
+        # Los resultados se entregan recién después del commit del lote
+        fallidas = 0
+        for futuro, resultado, error in resultados:
+            if error is None:
+                futuro.set_result(resultado)
+            else:
+                fallidas += 1
+                futuro.set_exception(error)
+
+        with self._lock:
+            self._lotes += 1
+            self._operaciones += len(lote)
+            self._fallidas += fallidas
+            self._tiempo_lotes += time.perf_counter() - inicio
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "lotes": self._lotes,
+                "operaciones": self._operaciones,
+                "fallidas": self._fallidas,
+                "pendientes": self._cola.qsize(),
+                "tamano_promedio_lote": round(self._operaciones / self._lotes, 2) if self._lotes else 0,
+                "tiempo_promedio_lote_ms": round(self._tiempo_lotes * 1000 / self._lotes, 3) if self._lotes else 0,
+            }
@@ -0,0 +1,113 @@
+PENDIENTE = "Pendiente"
+EN_PROCESO = "En Proceso"
+COMPLETADO = "Completado"
+CANCELADO = "Cancelado"
+
+ESTADOS = (PENDIENTE, EN_PROCESO, COMPLETADO, CANCELADO)
+# Pedidos que todavía hay que preparar; coincide con el índice parcial idx_pedidos_abiertos
+ABIERTOS = (PENDIENTE, EN_PROCESO)
+CONDICION_ABIERTOS = "estado IN ('Pendiente', 'En Proceso')"
+
+# Estado destino -> estados desde los que se puede llegar. Cancelado es definitivo y un
+# pedido completado ya no se puede cancelar.
+TRANSICIONES = {
+    PENDIENTE: (EN_PROCESO,),
+    EN_PROCESO: (PENDIENTE,),
+    COMPLETADO: (EN_PROCESO,),
+    CANCELADO: (PENDIENTE, EN_PROCESO),
+}
+
+# Cantidad de ids por sentencia en las transiciones masivas
+TAMANO_TRAMO = 500
+
+
+class TransicionInvalida(ValueError):
+    pass
+
+
+def _marcadores(valores):
+    return ", ".join("?" * len(valores))
+
+
+# Devuelve al stock las unidades de los pedidos cancelados: un solo UPDATE ... FROM con las
+# cantidades ya sumadas por producto, sin importar cuántos pedidos o líneas haya
+def _restaurar_stock(conn, pedido_ids):
+    conn.execute(f"""
+        UPDATE productos SET stock = stock + d.cantidad
+        FROM (SELECT producto_id, SUM(cantidad) AS cantidad
+              FROM detalle_pedido
+              WHERE pedido_id IN ({_marcadores(pedido_ids)})
+              GROUP BY producto_id) AS d
+        WHERE productos.id = d.producto_id
+    """, pedido_ids)
+
+
+def origenes(destino):
+    if destino not in TRANSICIONES:
+        raise TransicionInvalida(f"Estado desconocido: {destino}")
+    return TRANSICIONES[destino]
+
+
+# Cambia el estado de un pedido con un UPDATE condicional: la validación y la escritura son
+# una sola sentencia, así que dos trabajadores no pueden aplicar transiciones incompatibles.
+# Al cancelar, el stock se devuelve en la misma transacción. Devuelve None si el pedido no existe.
+def cambiar_estado(conn, pedido_id, destino):
+    permitidos = origenes(destino)
+    fila = conn.execute(f"""
+        UPDATE pedidos SET estado = ?
+        WHERE id = ? AND estado IN ({_marcadores(permitidos)})
+        RETURNING id
+    """, (destino, pedido_id, *permitidos)).fetchone()
+    if fila is not None:
+        if destino == CANCELADO:
+            _restaurar_stock(conn, [pedido_id])
+        return {"id": pedido_id, "estado": destino, "cambio": True}
+
+    actual = conn.execute("SELECT estado FROM pedidos WHERE id = ?", (pedido_id,)).fetchone()
+    if actual is None:
+        return None
+    if actual["estado"] == destino:
+        # Repetir la misma transición es inofensivo (reintentos de los trabajadores)
+        return {"id": pedido_id, "estado": destino, "cambio": False}
+    raise TransicionInvalida(f"No se puede pasar de '{actual['estado']}' a '{destino}'")
+
+
+# Transición masiva: un UPDATE ... WHERE id IN (...) por tramo, todo dentro de la transacción
+# del llamador. Los pedidos inexistentes o en un estado incompatible se informan sin abortar.
+def cambiar_estados(conn, ids, destino):
+    permitidos = origenes(destino)
+    ids = list(dict.fromkeys(ids))
+    actualizados = 0
+    sin_cambio = 0
+    no_encontrados = []
+    invalidos = []
+    for inicio in range(0, len(ids), TAMANO_TRAMO):
+        tramo = ids[inicio:inicio + TAMANO_TRAMO]
+        cambiados = {row[0] for row in conn.execute(f"""
+            UPDATE pedidos SET estado = ?
+            WHERE id IN ({_marcadores(tramo)}) AND estado IN ({_marcadores(permitidos)})
+            RETURNING id
+        """, (destino, *tramo, *permitidos))}
+        actualizados += len(cambiados)
+        if destino == CANCELADO and cambiados:
+            _restaurar_stock(conn, list(cambiados))
+        restantes = [pedido_id for pedido_id in tramo if pedido_id not in cambiados]
+        if not restantes:
+            continue
+        estados = {row[0]: row[1] for row in conn.execute(
+            f"SELECT id, estado FROM pedidos WHERE id IN ({_marcadores(restantes)})", restantes)}
+        for pedido_id in restantes:
+            estado = estados.get(pedido_id)
+            if estado is None:
+                no_encontrados.append(pedido_id)
+            elif estado == destino:
+                sin_cambio += 1
+            else:
+                invalidos.append({"id": pedido_id, "estado": estado})
+    return {
+        "estado": destino,
+        "actualizados": actualizados,
+        "sin_cambio": sin_cambio,
+        "no_encontrados": no_encontrados,
+        "invalidos": invalidos,
+    }
@@ -0,0 +1,105 @@
+import csv
+import io
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+from db import pool
+
+# Pedidos por consulta: cada lote se lee completo y libera su snapshot de lectura antes de
+# enviarse, así un cliente lento no frena los checkpoints del WAL
+PEDIDOS_POR_LOTE = 1000
+# Descargas simultáneas; las que exceden reciben 503 antes de empezar la respuesta
+MAX_EXPORTACIONES = int(os.environ.get("FITNESS_EXPORTS_MAX", "2"))
+
+_cupos = threading.BoundedSemaphore(MAX_EXPORTACIONES)
+
+
+class ExportacionesAgotadas(Exception):
+    pass
+
+
+def reservar():
+    if not _cupos.acquire(blocking=False):
+        raise ExportacionesAgotadas("Hay demasiadas exportaciones en curso, intente más tarde")
+
+
+def liberar():
+    _cupos.release()
+
+COLUMNAS_PEDIDO = ("id", "cliente_id", "cliente_nombre", "cliente_email", "fecha", "total", "estado")
+COLUMNAS_DETALLE = ("producto_id", "producto_nombre", "cantidad", "precio_unitario")
+
+# Una sola consulta ordenada por pedido: las líneas de cada pedido llegan contiguas
+CONSULTA = """
+    SELECT p.id, p.cliente_id, c.nombre AS cliente_nombre, c.email AS cliente_email,
+           p.fecha, p.total, p.estado,
+           dp.producto_id, pr.nombre AS producto_nombre, dp.cantidad, dp.precio_unitario
+    FROM pedidos p
+    LEFT JOIN clientes c ON c.id = p.cliente_id
+    LEFT JOIN detalle_pedido dp ON dp.pedido_id = p.id
+    LEFT JOIN productos pr ON pr.id = dp.producto_id
+"""
+
+
+def _conectar():
+    # Conexión propia de solo lectura: una descarga lenta no ocupa una conexión del pool
+    uri = Path(pool.ruta).resolve().as_uri() + "?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    conn.execute("PRAGMA busy_timeout = 5000")
+    conn.execute("PRAGMA mmap_size = 268435456")
+    return conn
+
+
+# Recorre los pedidos por rangos de id: las líneas de un pedido nunca quedan repartidas entre
+# dos lotes. Cada lote ve los datos confirmados al momento de leerlo.
+def _filas(condiciones, parametros):
+    filtro = " AND ".join(condiciones + ["p.id > ?"])
+    sql_tope = f"SELECT MAX(id) FROM (SELECT p.id FROM pedidos p WHERE {filtro} ORDER BY p.id LIMIT ?)"
+    # Mismo orden que idx_detalle_pedido_lineas (pedido_id, producto_id, ...): se lee sin ordenar
+    sql = CONSULTA + f" WHERE {filtro} AND p.id <= ? ORDER BY p.id, dp.producto_id"
+    conn = _conectar()
+    try:
+        ultimo = 0
+        while True:
+            tope, = conn.execute(sql_tope, (*parametros, ultimo, PEDIDOS_POR_LOTE)).fetchone()
+            if tope is None:
+                break
+            yield conn.execute(sql, (*parametros, ultimo, tope)).fetchall()
+            ultimo = tope
+    finally:
+        conn.close()
+
+
+def ndjson(condiciones, parametros):
+    # Un objeto JSON por pedido y por línea, con sus detalles anidados
+    actual = None
+    for lote in _filas(condiciones, parametros):
+        salida = []
+        for fila in lote:
+            if actual is None or actual["id"] != fila[0]:
+                if actual is not None:
+                    salida.append(json.dumps(actual, ensure_ascii=False))
+                actual = dict(zip(COLUMNAS_PEDIDO, fila[:7]))
+                actual["detalles"] = []
+            if fila[7] is not None:
+                actual["detalles"].append(dict(zip(COLUMNAS_DETALLE, fila[7:])))
+        if salida:
+            yield "\n".join(salida) + "\n"
+    if actual is not None:
+        yield json.dumps(actual, ensure_ascii=False) + "\n"
+
+
+def csv_plano(condiciones, parametros):
+    # Una fila por línea de pedido, repitiendo los datos del pedido
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(COLUMNAS_PEDIDO + COLUMNAS_DETALLE)
+    yield buffer.getvalue()
+    for lote in _filas(condiciones, parametros):
+        buffer.seek(0)
+        buffer.truncate()
+        escritor.writerows(lote)
+        yield buffer.getvalue()
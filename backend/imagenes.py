@@ -0,0 +1,228 @@
+import hashlib
+import mimetypes
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+
+from starlette.responses import Response
+
+# Pillow es opcional: sin él se sirven solo los originales
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+DIRECTORIO = os.environ.get("FITNESS_IMAGES_DIR", os.path.join(BASE, "static", "images"))
+DIRECTORIO_VARIANTES = os.environ.get("FITNESS_IMAGES_CACHE", os.path.join(BASE, "static", "variantes"))
+WORKERS = int(os.environ.get("FITNESS_IMAGES_WORKERS", "4"))
+
+EXTENSIONES = (".webp", ".png", ".jpg", ".jpeg")
+# Tamaño máximo (ancho, alto) de cada variante; se conserva la proporción
+VARIANTES = {
+    "thumb": (160, 160),
+    "card": (400, 400),
+}
+CALIDAD_WEBP = 80
+
+# Una imagen nueva se sube con otro nombre (cambia imagen_url), así que una URL nunca cambia de contenido
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class ImagenNoEncontrada(Exception):
+    pass
+
+
+class RangoInvalido(Exception):
+    pass
+
+
+def _rango(cabecera, tamano):
+    # Solo rangos simples (bytes=a-b, bytes=a-, bytes=-n); con varios rangos se envía el archivo completo
+    unidad, _, especificacion = cabecera.partition("=")
+    if unidad.strip() != "bytes" or "," in especificacion:
+        return None
+    inicio, _, fin = especificacion.strip().partition("-")
+    try:
+        if not inicio:
+            largo = int(fin)
+            if largo <= 0:
+                raise RangoInvalido
+            return max(0, tamano - largo), tamano - 1
+        inicio = int(inicio)
+        fin = int(fin) if fin else tamano - 1
+    except ValueError:
+        return None
+    if inicio >= tamano or fin < inicio:
+        raise RangoInvalido
+    return inicio, min(fin, tamano - 1)
+
+
+class AlmacenImagenes:
+    def __init__(self, directorio=DIRECTORIO, directorio_variantes=DIRECTORIO_VARIANTES, workers=WORKERS):
+        self.directorio = directorio
+        self.directorio_variantes = directorio_variantes
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._huellas = {}
+        self._generando = {}
+        self._pool = None
+        self.progreso = {"total": 0, "generadas": 0, "errores": 0, "en_curso": False}
+
+    def _ruta_original(self, nombre):
+        if os.path.basename(nombre) != nombre or not nombre.lower().endswith(EXTENSIONES):
+            raise ImagenNoEncontrada(nombre)
+        ruta = os.path.join(self.directorio, nombre)
+        if not os.path.isfile(ruta):
+            raise ImagenNoEncontrada(nombre)
+        return ruta
+
+    def huella(self, ruta):
+        # Hash del contenido, recalculado solo si cambia el archivo (mismo ETag en todos los servidores)
+        estado = os.stat(ruta)
+        clave = (ruta, estado.st_mtime_ns, estado.st_size)
+        with self._lock:
+            huella = self._huellas.get(clave)
+        if huella is None:
+            with open(ruta, "rb") as archivo:
+                huella = hashlib.blake2b(archivo.read(), digest_size=8).hexdigest()
+            with self._lock:
+                self._huellas[clave] = huella
+        return huella, estado
+
+    def _ruta_variante(self, nombre, variante, huella):
+        # La huella del original va en el nombre: si el original cambia, la variante vieja queda sin uso
+        base = os.path.splitext(nombre)[0]
+        return os.path.join(self.directorio_variantes, variante, f"{base}-{huella}.webp")
+
+    def _generar(self, original, destino, variante):
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        with Image.open(original) as imagen:
+            imagen.thumbnail(VARIANTES[variante], Image.LANCZOS)
+            # Se escribe en un temporal y se renombra: nunca se sirve un archivo a medio escribir
+            descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(destino), suffix=".tmp")
+            try:
+                with os.fdopen(descriptor, "wb") as salida:
+                    imagen.save(salida, "WEBP", quality=CALIDAD_WEBP, method=4)
+                os.replace(temporal, destino)
+            except BaseException:
+                os.unlink(temporal)
+                raise
+
+    def variante(self, nombre, variante):
+        original = self._ruta_original(nombre)
+        if variante is None or Image is None:
+            return original
+        huella, _ = self.huella(original)
+        destino = self._ruta_variante(nombre, variante, huella)
+        if os.path.isfile(destino):
+            return destino
+
+        # Si otra petición ya la está generando, se espera a que termine en lugar de repetir el trabajo
+        with self._lock:
+            evento = self._generando.get(destino)
+            propia = evento is None
+            if propia:
+                evento = self._generando[destino] = threading.Event()
+        if propia:
+            try:
+                self._generar(original, destino, variante)
+            finally:
+                with self._lock:
+                    del self._generando[destino]
+                evento.set()
+        else:
+            evento.wait()
+        return destino if os.path.isfile(destino) else original
+
+    def respuesta(self, request, nombre, variante=None):
+        try:
+            ruta = self.variante(nombre, variante)
+        except OSError:
+            # Imagen que Pillow no puede procesar: mejor el original que un error
+            ruta = self._ruta_original(nombre)
+        huella, estado = self.huella(ruta)
+        etag = f'"{huella}"'
+        headers = {
+            "ETag": etag,
+            "Cache-Control": CACHE_CONTROL,
+            "Last-Modified": formatdate(estado.st_mtime, usegmt=True),
+            "Accept-Ranges": "bytes",
+        }
+        media_type = mimetypes.guess_type(ruta)[0] or "application/octet-stream"
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and (if_none_match.strip() == "*" or etag in if_none_match):
+            return Response(status_code=304, headers=headers)
+
+        rango = None
+        cabecera = request.headers.get("range")
+        # If-Range: el rango solo vale si el cliente tiene la misma versión del archivo
+        if cabecera and request.headers.get("if-range", etag) == etag:
+            try:
+                rango = _rango(cabecera, estado.st_size)
+            except RangoInvalido:
+                headers["Content-Range"] = f"bytes */{estado.st_size}"
+                return Response(status_code=416, headers=headers)
+
+        with open(ruta, "rb") as archivo:
+            if rango is None:
+                return Response(archivo.read(), media_type=media_type, headers=headers)
+            inicio, fin = rango
+            archivo.seek(inicio)
+            contenido = archivo.read(fin - inicio + 1)
+        headers["Content-Range"] = f"bytes {inicio}-{fin}/{estado.st_size}"
+        return Response(contenido, status_code=206, media_type=media_type, headers=headers)
+
+    # Genera por adelantado todas las variantes de `nombres` en un pool de hilos
+    def pregenerar(self, nombres):
+        if Image is None:
+            return False
+        with self._lock:
+            if self.progreso["en_curso"]:
+                return False
+            trabajos = [(nombre, variante) for nombre in dict.fromkeys(nombres) for variante in VARIANTES]
+            self.progreso = {"total": len(trabajos), "generadas": 0, "errores": 0, "en_curso": True}
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="variantes")
+        pendientes = [len(trabajos)]
+
+        def trabajo(nombre, variante):
+            try:
+                self.variante(nombre, variante)
+                clave = "generadas"
+            except Exception:
+                clave = "errores"
+            with self._lock:
+                self.progreso[clave] += 1
+                pendientes[0] -= 1
+                if pendientes[0] == 0:
+                    self.progreso["en_curso"] = False
+
+        if not trabajos:
+            self.progreso["en_curso"] = False
+        for nombre, variante in trabajos:
+            self._pool.submit(trabajo, nombre, variante)
+        return True
+
+    def detener(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def estadisticas(self):
+        with self._lock:
+            return {"pillow": Image is not None, "variantes": list(VARIANTES), **self.progreso}
+
+
+# Nombres de archivo de las imágenes usadas por el catálogo (imagen_url = /static/images/<nombre>)
+def nombres_catalogo(conn):
+    nombres = []
+    for (url,) in conn.execute(
+            "SELECT DISTINCT imagen_url FROM productos WHERE imagen_url LIKE '/static/images/%'"):
+        nombre = url.rsplit("/", 1)[-1]
+        if nombre:
+            nombres.append(nombre)
+    return nombres
@@ -0,0 +1,350 @@
+import csv
+import io
+import json
+import sqlite3
+
+from db import pool
+
+TAMANO_LOTE = 500
+MAX_ERRORES = 1000
+
+CAMPOS_PRODUCTO = {
+    "id": int,
+    "nombre": str,
+    "descripcion": str,
+    "precio": float,
+    "stock": int,
+    "categoria_id": int,
+    "imagen_url": str,
+}
+REQUERIDOS_PRODUCTO = ("nombre", "descripcion", "precio", "stock", "categoria_id")
+
+CAMPOS_AJUSTE = {
+    "id": int,
+    "nombre": str,
+    "precio_delta": float,
+    "stock_delta": int,
+}
+
+CAMPOS_CLIENTE = {
+    "nombre": str,
+    "email": str,
+    "telefono": str,
+    "direccion": str,
+}
+REQUERIDOS_CLIENTE = ("nombre", "email", "telefono", "direccion")
+
+
+class FilaInvalida(ValueError):
+    pass
+
+
+def detectar_formato(formato, nombre_archivo, content_type):
+    if formato:
+        return formato
+    nombre = (nombre_archivo or "").lower()
+    if nombre.endswith(".csv") or "csv" in (content_type or ""):
+        return "csv"
+    return "ndjson"
+
+
+def leer_filas(archivo, formato):
+    # Genera (número de fila, dict o excepción) leyendo el archivo de a una línea
+    texto = io.TextIOWrapper(archivo, encoding="utf-8-sig", newline="")
+    if formato == "csv":
+        lector = csv.DictReader(texto)
+        for numero, fila in enumerate(lector, start=2):
+            yield numero, fila
+        return
+    for numero, linea in enumerate(texto, start=1):
+        if not linea.strip():
+            continue
+        try:
+            fila = json.loads(linea)
+        except ValueError as e:
+            yield numero, FilaInvalida(f"JSON inválido: {e}")
+            continue
+        if not isinstance(fila, dict):
+            yield numero, FilaInvalida("Cada línea debe ser un objeto JSON")
+            continue
+        yield numero, fila
+
+
+def convertir(fila, campos):
+    # Valores vacíos (celdas CSV sin contenido) cuentan como no informados
+    resultado = {}
+    for campo, tipo in campos.items():
+        valor = fila.get(campo)
+        if valor is None or valor == "":
+            continue
+        try:
+            if tipo is int and isinstance(valor, str):
+                valor = int(valor.strip())
+            elif tipo is int and isinstance(valor, float):
+                if not valor.is_integer():
+                    raise ValueError
+                valor = int(valor)
+            else:
+                valor = tipo(valor)
+        except (TypeError, ValueError):
+            raise FilaInvalida(f"Valor inválido para '{campo}': {valor!r}")
+        resultado[campo] = valor
+    return resultado
+
+
+def en_lotes(filas, tamano=TAMANO_LOTE):
+    lote = []
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) >= tamano:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+class Reporte:
+    def __init__(self):
+        self.procesadas = 0
+        self.insertadas = 0
+        self.actualizadas = 0
+        self.omitidas = 0
+        self.errores = []
+        self.total_errores = 0
+
+    def error(self, fila, mensaje):
+        self.total_errores += 1
+        if len(self.errores) < MAX_ERRORES:
+            self.errores.append({"fila": fila, "error": mensaje})
+
+    def como_dict(self):
+        return {
+            "procesadas": self.procesadas,
+            "insertadas": self.insertadas,
+            "actualizadas": self.actualizadas,
+            "omitidas": self.omitidas,
+            "errores": sorted(self.errores, key=lambda error: error["fila"]),
+            "total_errores": self.total_errores,
+        }
+
+
+def _validar(filas, campos, reporte):
+    for numero, fila in filas:
+        reporte.procesadas += 1
+        if isinstance(fila, Exception):
+            reporte.error(numero, str(fila))
+            continue
+        try:
+            yield numero, convertir(fila, campos)
+        except FilaInvalida as e:
+            reporte.error(numero, str(e))
+
+
+def _marcadores(valores):
+    return ", ".join("?" * len(valores))
+
+
+# Los emails se guardan en minúsculas; las búsquedas usan lower(email) (idx_clientes_email_lower)
+# porque las filas cargadas antes de normalizar pueden tener mayúsculas
+def normalizar_email(email):
+    return email.strip().lower()
+
+
+def _ids_por_nombre(conn, nombres):
+    ids = {}
+    ambiguos = set()
+    if nombres:
+        for row in conn.execute(
+                f"SELECT id, nombre FROM productos WHERE nombre IN ({_marcadores(nombres)})", list(nombres)):
+            if row["nombre"] in ids:
+                ambiguos.add(row["nombre"])
+            ids[row["nombre"]] = row["id"]
+    return ids, ambiguos
+
+
+def _ejecutar_lote(conn, sql, parametros, numeros, reporte):
+    # Con executemany el lote entero falla ante un error de integridad;
+    # en ese caso se reintenta fila por fila para aislar las que fallan
+    if not parametros:
+        return 0
+    conn.execute("SAVEPOINT lote")
+    try:
+        conn.executemany(sql, parametros)
+        conn.execute("RELEASE lote")
+        return len(parametros)
+    except sqlite3.IntegrityError:
+        conn.execute("ROLLBACK TO lote")
+        conn.execute("RELEASE lote")
+    correctas = 0
+    for numero, valores in zip(numeros, parametros):
+        try:
+            conn.execute(sql, valores)
+            correctas += 1
+        except sqlite3.IntegrityError as e:
+            reporte.error(numero, str(e))
+    return correctas
+
+
+SQL_ACTUALIZAR_PRODUCTO = """
+    UPDATE productos SET
+        nombre = COALESCE(?, nombre),
+        descripcion = COALESCE(?, descripcion),
+        precio = COALESCE(?, precio),
+        stock = COALESCE(?, stock),
+        categoria_id = COALESCE(?, categoria_id),
+        imagen_url = COALESCE(?, imagen_url)
+    WHERE id = ?
+"""
+
+SQL_INSERTAR_PRODUCTO = """
+    INSERT INTO productos (nombre, descripcion, precio, stock, categoria_id, imagen_url)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+
+def importar_productos(archivo, formato):
+    reporte = Reporte()
+    filas = _validar(leer_filas(archivo, formato), CAMPOS_PRODUCTO, reporte)
+    for lote in en_lotes(filas):
+        with pool.transaccion() as conn:
+            ids = [fila["id"] for _, fila in lote if "id" in fila]
+            existentes = set()
+            if ids:
+                existentes = {row[0] for row in conn.execute(
+                    f"SELECT id FROM productos WHERE id IN ({_marcadores(ids)})", ids)}
+            nombres = {fila["nombre"] for _, fila in lote if "id" not in fila and "nombre" in fila}
+            por_nombre, ambiguos = _ids_por_nombre(conn, nombres)
+
+            actualizar, numeros_actualizar = [], []
+            nuevos = {}
+            for numero, fila in lote:
+                producto_id = fila.get("id")
+                if producto_id is None:
+                    nombre = fila.get("nombre")
+                    if nombre is None:
+                        reporte.error(numero, "Se requiere 'id' o 'nombre'")
+                        continue
+                    if nombre in ambiguos:
+                        reporte.error(numero, f"Hay varios productos llamados '{nombre}', use 'id'")
+                        continue
+                    producto_id = por_nombre.get(nombre)
+                    if producto_id is None:
+                        # Producto nuevo; si el nombre se repite en el lote, la última fila completa a la anterior
+                        previo = nuevos.get(nombre, (numero, {}))[1]
+                        nuevos[nombre] = (numero, {**previo, **fila})
+                        continue
+                elif producto_id not in existentes:
+                    reporte.error(numero, f"Producto {producto_id} no encontrado")
+                    continue
+                actualizar.append(tuple(fila.get(campo) for campo in (
+                    "nombre", "descripcion", "precio", "stock", "categoria_id", "imagen_url")) + (producto_id,))
+                numeros_actualizar.append(numero)
+
+            insertar, numeros_insertar = [], []
+            for numero, fila in nuevos.values():
+                faltantes = [campo for campo in REQUERIDOS_PRODUCTO if campo not in fila]
+                if faltantes:
+                    reporte.error(numero, f"Faltan campos para crear el producto: {', '.join(faltantes)}")
+                    continue
+                insertar.append(tuple(fila.get(campo) for campo in (
+                    "nombre", "descripcion", "precio", "stock", "categoria_id", "imagen_url")))
+                numeros_insertar.append(numero)
+
+            reporte.actualizadas += _ejecutar_lote(
+                conn, SQL_ACTUALIZAR_PRODUCTO, actualizar, numeros_actualizar, reporte)
+            reporte.insertadas += _ejecutar_lote(
+                conn, SQL_INSERTAR_PRODUCTO, insertar, numeros_insertar, reporte)
+    return reporte.como_dict()
+
+
+def ajustar_productos(archivo, formato):
+    reporte = Reporte()
+    filas = _validar(leer_filas(archivo, formato), CAMPOS_AJUSTE, reporte)
+    for lote in en_lotes(filas):
+        with pool.transaccion() as conn:
+            nombres = {fila["nombre"] for _, fila in lote if "id" not in fila and "nombre" in fila}
+            por_nombre, ambiguos = _ids_por_nombre(conn, nombres)
+            ids = [fila["id"] for _, fila in lote if "id" in fila] + list(por_nombre.values())
+            actuales = {}
+            if ids:
+                actuales = {row["id"]: [row["precio"], row["stock"]] for row in conn.execute(
+                    f"SELECT id, precio, stock FROM productos WHERE id IN ({_marcadores(ids)})", ids)}
+
+            # Los ajustes se acumulan en memoria y se validan contra los valores actuales
+            ajustes = {}
+            for numero, fila in lote:
+                if "precio_delta" not in fila and "stock_delta" not in fila:
+                    reporte.error(numero, "Se requiere 'precio_delta' o 'stock_delta'")
+                    continue
+                producto_id = fila.get("id")
+                if producto_id is None:
+                    nombre = fila.get("nombre")
+                    if nombre in ambiguos:
+                        reporte.error(numero, f"Hay varios productos llamados '{nombre}', use 'id'")
+                        continue
+                    producto_id = por_nombre.get(nombre)
+                if producto_id not in actuales:
+                    reporte.error(numero, f"Producto {fila.get('id', fila.get('nombre'))} no encontrado")
+                    continue
+                precio, stock = actuales[producto_id]
+                precio_nuevo = precio + fila.get("precio_delta", 0)
+                stock_nuevo = stock + fila.get("stock_delta", 0)
+                if precio_nuevo < 0 or stock_nuevo < 0:
+                    reporte.error(numero, f"El ajuste deja precio o stock negativo para el producto {producto_id}")
+                    continue
+                actuales[producto_id] = [precio_nuevo, stock_nuevo]
+                ajustes[producto_id] = numero
+
+            cambios = [(actuales[producto_id][0], actuales[producto_id][1], producto_id)
+                       for producto_id in ajustes]
+            reporte.actualizadas += _ejecutar_lote(
+                conn, "UPDATE productos SET precio = ?, stock = ? WHERE id = ?",
+                cambios, list(ajustes.values()), reporte)
+    return reporte.como_dict()
+
+
+def importar_clientes(archivo, formato, actualizar_existentes=False):
+    reporte = Reporte()
+    vistos = set()
+    filas = _validar(leer_filas(archivo, formato), CAMPOS_CLIENTE, reporte)
+    for lote in en_lotes(filas):
+        validas = []
+        for numero, fila in lote:
+            faltantes = [campo for campo in REQUERIDOS_CLIENTE if campo not in fila]
+            if faltantes:
+                reporte.error(numero, f"Faltan campos: {', '.join(faltantes)}")
+                continue
+            fila["email"] = normalizar_email(fila["email"])
+            if fila["email"] in vistos:
+                reporte.error(numero, f"Email repetido en el archivo: {fila['email']}")
+                continue
+            vistos.add(fila["email"])
+            validas.append((numero, fila))
+        if not validas:
+            continue
+
+        with pool.transaccion() as conn:
+            emails = [fila["email"] for _, fila in validas]
+            existentes = {row[0] for row in conn.execute(
+                f"SELECT lower(email) FROM clientes WHERE lower(email) IN ({_marcadores(emails)})", emails)}
+
+            insertar, numeros_insertar = [], []
+            actualizar, numeros_actualizar = [], []
+            for numero, fila in validas:
+                valores = (fila["nombre"], fila["telefono"], fila["direccion"], fila["email"])
+                if fila["email"] not in existentes:
+                    insertar.append(valores)
+                    numeros_insertar.append(numero)
+                elif actualizar_existentes:
+                    actualizar.append(valores)
+                    numeros_actualizar.append(numero)
+                else:
+                    reporte.omitidas += 1
+
+            reporte.insertadas += _ejecutar_lote(conn, """
+                INSERT INTO clientes (nombre, telefono, direccion, email) VALUES (?, ?, ?, ?)
+            """, insertar, numeros_insertar, reporte)
+            reporte.actualizadas += _ejecutar_lote(conn, """
+                UPDATE clientes SET nombre = ?, telefono = ?, direccion = ? WHERE lower(email) = ?
+            """, actualizar, numeros_actualizar, reporte)
+    return reporte.como_dict()
@@ -1,20 +1,512 @@
+import argparse
+import os
+import random
 import sqlite3
+import time
+from datetime import date, timedelta
 
-def init_database():
-    conn = sqlite3.connect("fitness_store.db")
-    cursor = conn.cursor()
-    
-    # Crear tabla de categorías
+# Índices secundarios para los filtros y la paginación de la API
+INDICES = [
+    "CREATE INDEX IF NOT EXISTS idx_productos_categoria ON productos(categoria_id, precio)",
+    "CREATE INDEX IF NOT EXISTS idx_productos_precio ON productos(precio)",
+    "CREATE INDEX IF NOT EXISTS idx_productos_stock ON productos(stock)",
+    "CREATE INDEX IF NOT EXISTS idx_productos_nombre ON productos(nombre)",
+    "CREATE INDEX IF NOT EXISTS idx_clientes_nombre ON clientes(nombre)",
+    # Historial por cliente: índices cubrientes, la consulta no necesita leer las tablas
+    "DROP INDEX IF EXISTS idx_pedidos_cliente",
+    "CREATE INDEX IF NOT EXISTS idx_pedidos_cliente_historial ON pedidos(cliente_id, fecha, id, total, estado)",
+    "CREATE INDEX IF NOT EXISTS idx_pedidos_fecha ON pedidos(fecha)",
+    "CREATE INDEX IF NOT EXISTS idx_pedidos_estado ON pedidos(estado, fecha)",
+    # Índice parcial de pedidos abiertos: no crece con el historial de pedidos completados
+    "CREATE INDEX IF NOT EXISTS idx_pedidos_abiertos ON pedidos(fecha) WHERE estado IN ('Pendiente', 'En Proceso')",
+    "DROP INDEX IF EXISTS idx_detalle_pedido_pedido",
+    "CREATE INDEX IF NOT EXISTS idx_detalle_pedido_lineas ON detalle_pedido(pedido_id, producto_id, cantidad, precio_unitario)",
+    "CREATE INDEX IF NOT EXISTS idx_detalle_pedido_producto ON detalle_pedido(producto_id)",
+]
+
+def crear_indices(cursor):
+    for indice in INDICES:
+        cursor.execute(indice)
+
+# Búsqueda de texto completo sobre productos: sin acentos y con índices de prefijo para autocompletar
+BUSQUEDA = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS productos_fts USING fts5(
+        nombre, descripcion,
+        content='productos', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS productos_fts_insert AFTER INSERT ON productos BEGIN
+        INSERT INTO productos_fts(rowid, nombre, descripcion)
+        VALUES (new.id, new.nombre, new.descripcion);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS productos_fts_delete AFTER DELETE ON productos BEGIN
+        INSERT INTO productos_fts(productos_fts, rowid, nombre, descripcion)
+        VALUES ('delete', old.id, old.nombre, old.descripcion);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS productos_fts_update AFTER UPDATE OF nombre, descripcion ON productos BEGIN
+        INSERT INTO productos_fts(productos_fts, rowid, nombre, descripcion)
+        VALUES ('delete', old.id, old.nombre, old.descripcion);
+        INSERT INTO productos_fts(rowid, nombre, descripcion)
+        VALUES (new.id, new.nombre, new.descripcion);
+    END
+    """,
+]
+
+def crear_busqueda(cursor):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'productos_fts'")
+    existia = cursor.fetchone() is not None
+    for sentencia in BUSQUEDA:
+        cursor.execute(sentencia)
+    # Si la tabla es nueva en una base con datos, se indexan los productos existentes
+    if not existia:
+        cursor.execute("INSERT INTO productos_fts(productos_fts) VALUES ('rebuild')")
+
+# Versión del catálogo: cualquier escritura en productos o categorías (incluido el stock) la incrementa
+VERSION_CATALOGO = [
+    """
+    CREATE TABLE IF NOT EXISTS catalogo_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL
+    )
+    """,
+    "INSERT OR IGNORE INTO catalogo_version (id, version) VALUES (1, 1)",
+] + [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {tabla}_version_{evento.lower()} AFTER {evento} ON {tabla} BEGIN
+        UPDATE catalogo_version SET version = version + 1 WHERE id = 1;
+    END
+    """
+    for tabla in ("productos", "categorias")
+    for evento in ("INSERT", "UPDATE", "DELETE")
+]
+
+def crear_version_catalogo(cursor):
+    for sentencia in VERSION_CATALOGO:
+        cursor.execute(sentencia)
+
+# Archivo de pedidos viejos (completados o cancelados), con las mismas columnas que las tablas
+# activas. Las vistas *_historico unen ambas para reportes y reconstrucciones.
+ARCHIVO = [
+    """
+    CREATE TABLE IF NOT EXISTS pedidos_archivo (
+        id INTEGER PRIMARY KEY,
+        cliente_id INTEGER NOT NULL,
+        fecha TEXT NOT NULL,
+        total REAL NOT NULL,
+        estado TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_pedidos_archivo_cliente ON pedidos_archivo(cliente_id, fecha, estado)",
+    """
+    CREATE TABLE IF NOT EXISTS detalle_pedido_archivo (
+        id INTEGER PRIMARY KEY,
+        pedido_id INTEGER NOT NULL,
+        producto_id INTEGER NOT NULL,
+        cantidad INTEGER NOT NULL,
+        precio_unitario REAL NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_detalle_pedido_archivo_pedido ON detalle_pedido_archivo(pedido_id)",
+    """
+    CREATE VIEW IF NOT EXISTS pedidos_historico AS
+    SELECT id, cliente_id, fecha, total, estado FROM pedidos
+    UNION ALL
+    SELECT id, cliente_id, fecha, total, estado FROM pedidos_archivo
+    """,
+    """
+    CREATE VIEW IF NOT EXISTS detalle_pedido_historico AS
+    SELECT id, pedido_id, producto_id, cantidad, precio_unitario FROM detalle_pedido
+    UNION ALL
+    SELECT id, pedido_id, producto_id, cantidad, precio_unitario FROM detalle_pedido_archivo
+    """,
+]
+
+def crear_archivo(cursor):
+    for sentencia in ARCHIVO:
+        cursor.execute(sentencia)
+
+# Un pedido cancelado deja de contar en los resúmenes al cancelarse (los triggers *_cancelar).
+# Borrar filas que ya se copiaron al archivo es un traslado: los resúmenes conservan el historial.
+PEDIDO_NO_ARCHIVADO = "NOT EXISTS (SELECT 1 FROM pedidos_archivo WHERE id = old.id)"
+LINEA_VIGENTE = """NOT EXISTS (SELECT 1 FROM detalle_pedido_archivo WHERE id = old.id)
+        AND NOT EXISTS (SELECT 1 FROM pedidos WHERE id = old.pedido_id AND estado IS 'Cancelado')"""
+CANCELACION = "new.estado IS 'Cancelado' AND old.estado IS NOT 'Cancelado'"
+
+# Unidades e ingresos por producto de las líneas de un pedido
+LINEAS_PEDIDO = """(SELECT producto_id, SUM(cantidad) AS unidades, SUM(cantidad * precio_unitario) AS ingresos
+              FROM detalle_pedido WHERE pedido_id = new.id GROUP BY producto_id)"""
+
+# Resúmenes para el dashboard, mantenidos por triggers en cada alta, baja o cambio de pedido.
+# Los triggers que cambiaron se borran y se vuelven a crear para actualizar las bases existentes.
+ESTADISTICAS = [
+    """
+    CREATE TABLE IF NOT EXISTS resumen_pedidos (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        pedidos INTEGER NOT NULL DEFAULT 0,
+        ingresos REAL NOT NULL DEFAULT 0
+    )
+    """,
+    "INSERT OR IGNORE INTO resumen_pedidos (id, pedidos, ingresos) VALUES (1, 0, 0)",
+    """
+    CREATE TABLE IF NOT EXISTS resumen_estados (
+        estado TEXT PRIMARY KEY,
+        pedidos INTEGER NOT NULL DEFAULT 0,
+        ingresos REAL NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ventas_producto (
+        producto_id INTEGER PRIMARY KEY,
+        unidades INTEGER NOT NULL DEFAULT 0,
+        ingresos REAL NOT NULL DEFAULT 0
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_ventas_producto_unidades ON ventas_producto(unidades)",
+    """
+    CREATE TRIGGER IF NOT EXISTS pedidos_resumen_insert AFTER INSERT ON pedidos BEGIN
+        UPDATE resumen_pedidos SET pedidos = pedidos + 1, ingresos = ingresos + new.total WHERE id = 1;
+        INSERT INTO resumen_estados (estado, pedidos, ingresos) VALUES (new.estado, 1, new.total)
+        ON CONFLICT(estado) DO UPDATE SET pedidos = pedidos + 1, ingresos = ingresos + excluded.ingresos;
+    END
+    """,
+    "DROP TRIGGER IF EXISTS pedidos_resumen_delete",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS pedidos_resumen_delete AFTER DELETE ON pedidos
+    WHEN {PEDIDO_NO_ARCHIVADO} BEGIN
+        UPDATE resumen_pedidos SET pedidos = pedidos - (old.estado IS NOT 'Cancelado'),
+                                   ingresos = ingresos - IIF(old.estado IS 'Cancelado', 0, old.total)
+        WHERE id = 1;
+        UPDATE resumen_estados SET pedidos = pedidos - 1, ingresos = ingresos - old.total
+        WHERE estado = old.estado;
+    END
+    """,
+    "DROP TRIGGER IF EXISTS pedidos_resumen_update",
+    """
+    CREATE TRIGGER IF NOT EXISTS pedidos_resumen_update AFTER UPDATE OF estado, total ON pedidos BEGIN
+        UPDATE resumen_pedidos SET
+            pedidos = pedidos + (old.estado IS 'Cancelado') - (new.estado IS 'Cancelado'),
+            ingresos = ingresos - IIF(old.estado IS 'Cancelado', 0, old.total)
+                                + IIF(new.estado IS 'Cancelado', 0, new.total)
+        WHERE id = 1;
+        UPDATE resumen_estados SET pedidos = pedidos - 1, ingresos = ingresos - old.total
+        WHERE estado = old.estado;
+        INSERT INTO resumen_estados (estado, pedidos, ingresos) VALUES (new.estado, 1, new.total)
+        ON CONFLICT(estado) DO UPDATE SET pedidos = pedidos + 1, ingresos = ingresos + excluded.ingresos;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS detalle_pedido_ventas_insert AFTER INSERT ON detalle_pedido BEGIN
+        INSERT INTO ventas_producto (producto_id, unidades, ingresos)
+        VALUES (new.producto_id, new.cantidad, new.cantidad * new.precio_unitario)
+        ON CONFLICT(producto_id) DO UPDATE SET unidades = unidades + excluded.unidades,
+                                               ingresos = ingresos + excluded.ingresos;
+    END
+    """,
+    "DROP TRIGGER IF EXISTS detalle_pedido_ventas_delete",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS detalle_pedido_ventas_delete AFTER DELETE ON detalle_pedido
+    WHEN {LINEA_VIGENTE} BEGIN
+        UPDATE ventas_producto SET unidades = unidades - old.cantidad,
+                                   ingresos = ingresos - old.cantidad * old.precio_unitario
+        WHERE producto_id = old.producto_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS pedidos_ventas_cancelar AFTER UPDATE OF estado ON pedidos
+    WHEN {CANCELACION} BEGIN
+        UPDATE ventas_producto SET unidades = ventas_producto.unidades - l.unidades,
+                                   ingresos = ventas_producto.ingresos - l.ingresos
+        FROM {LINEAS_PEDIDO} AS l
+        WHERE ventas_producto.producto_id = l.producto_id;
+    END
+    """,
+]
+
+def crear_estadisticas(cursor):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'resumen_estados'")
+    existia = cursor.fetchone() is not None
+    for sentencia in ESTADISTICAS:
+        cursor.execute(sentencia)
+    if not existia:
+        reconstruir_estadisticas(cursor)
+
+# Recalcula los resúmenes desde cero a partir de los pedidos activos y archivados
+def reconstruir_estadisticas(cursor):
+    cursor.execute("""
+        UPDATE resumen_pedidos
+        SET pedidos = (SELECT COUNT(*) FROM pedidos_historico WHERE estado IS NOT 'Cancelado'),
+            ingresos = (SELECT COALESCE(SUM(total), 0) FROM pedidos_historico WHERE estado IS NOT 'Cancelado')
+        WHERE id = 1
+    """)
+    cursor.execute("DELETE FROM resumen_estados")
     cursor.execute("""
+        INSERT INTO resumen_estados (estado, pedidos, ingresos)
+        SELECT estado, COUNT(*), SUM(total) FROM pedidos_historico GROUP BY estado
+    """)
+    cursor.execute("DELETE FROM ventas_producto")
+    cursor.execute("""
+        INSERT INTO ventas_producto (producto_id, unidades, ingresos)
+        SELECT dp.producto_id, SUM(dp.cantidad), SUM(dp.cantidad * dp.precio_unitario)
+        FROM detalle_pedido_historico dp
+        JOIN pedidos_historico p ON p.id = dp.pedido_id
+        WHERE p.estado IS NOT 'Cancelado'
+        GROUP BY dp.producto_id
+    """)
+
+# Primer o último pedido no cancelado de un cliente, incluidos los archivados
+def _fecha_cliente(funcion, cliente):
+    return f"""(SELECT {funcion}(fecha) FROM pedidos_historico
+                            WHERE cliente_id = {cliente} AND estado IS NOT 'Cancelado')"""
+
+# Totales históricos por cliente; las fechas extremas se recalculan con el índice del historial
+RESUMEN_CLIENTES = [
+    """
+    CREATE TABLE IF NOT EXISTS resumen_clientes (
+        cliente_id INTEGER PRIMARY KEY,
+        pedidos INTEGER NOT NULL DEFAULT 0,
+        total_gastado REAL NOT NULL DEFAULT 0,
+        primer_pedido TEXT,
+        ultimo_pedido TEXT
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS pedidos_clientes_insert AFTER INSERT ON pedidos BEGIN
+        INSERT INTO resumen_clientes (cliente_id, pedidos, total_gastado, primer_pedido, ultimo_pedido)
+        VALUES (new.cliente_id, 1, new.total, new.fecha, new.fecha)
+        ON CONFLICT(cliente_id) DO UPDATE SET
+            pedidos = pedidos + 1,
+            total_gastado = total_gastado + excluded.total_gastado,
+            primer_pedido = MIN(COALESCE(primer_pedido, excluded.primer_pedido), excluded.primer_pedido),
+            ultimo_pedido = MAX(COALESCE(ultimo_pedido, excluded.ultimo_pedido), excluded.ultimo_pedido);
+    END
+    """,
+    "DROP TRIGGER IF EXISTS pedidos_clientes_delete",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS pedidos_clientes_delete AFTER DELETE ON pedidos
+    WHEN old.estado IS NOT 'Cancelado' AND {PEDIDO_NO_ARCHIVADO} BEGIN
+        UPDATE resumen_clientes SET
+            pedidos = pedidos - 1,
+            total_gastado = total_gastado - old.total,
+            primer_pedido = {_fecha_cliente("MIN", "old.cliente_id")},
+            ultimo_pedido = {_fecha_cliente("MAX", "old.cliente_id")}
+        WHERE cliente_id = old.cliente_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS pedidos_clientes_cancelar AFTER UPDATE OF estado ON pedidos
+    WHEN {CANCELACION} BEGIN
+        UPDATE resumen_clientes SET
+            pedidos = pedidos - 1,
+            total_gastado = total_gastado - old.total,
+            primer_pedido = {_fecha_cliente("MIN", "old.cliente_id")},
+            ultimo_pedido = {_fecha_cliente("MAX", "old.cliente_id")}
+        WHERE cliente_id = old.cliente_id;
+    END
+    """,
+    "DROP TRIGGER IF EXISTS pedidos_clientes_update",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS pedidos_clientes_update AFTER UPDATE OF cliente_id, total, fecha ON pedidos
+    WHEN old.estado IS NOT 'Cancelado' BEGIN
+        UPDATE resumen_clientes SET
+            pedidos = pedidos - 1,
+            total_gastado = total_gastado - old.total,
+            primer_pedido = {_fecha_cliente("MIN", "old.cliente_id")},
+            ultimo_pedido = {_fecha_cliente("MAX", "old.cliente_id")}
+        WHERE cliente_id = old.cliente_id;
+        INSERT INTO resumen_clientes (cliente_id, pedidos, total_gastado, primer_pedido, ultimo_pedido)
+        VALUES (new.cliente_id, 1, new.total, new.fecha, new.fecha)
+        ON CONFLICT(cliente_id) DO UPDATE SET
+            pedidos = pedidos + 1,
+            total_gastado = total_gastado + excluded.total_gastado,
+            primer_pedido = {_fecha_cliente("MIN", "new.cliente_id")},
+            ultimo_pedido = {_fecha_cliente("MAX", "new.cliente_id")};
+    END
+    """,
+]
+
+def crear_resumen_clientes(cursor):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'resumen_clientes'")
+    existia = cursor.fetchone() is not None
+    for sentencia in RESUMEN_CLIENTES:
+        cursor.execute(sentencia)
+    if not existia:
+        reconstruir_resumen_clientes(cursor)
+
+def reconstruir_resumen_clientes(cursor):
+    cursor.execute("DELETE FROM resumen_clientes")
+    cursor.execute("""
+        INSERT INTO resumen_clientes (cliente_id, pedidos, total_gastado, primer_pedido, ultimo_pedido)
+        SELECT cliente_id, COUNT(*), SUM(total), MIN(fecha), MAX(fecha)
+        FROM pedidos_historico WHERE estado IS NOT 'Cancelado' GROUP BY cliente_id
+    """)
+
+# Ventas agregadas por día y producto para los reportes de analítica
+VENTAS_DIARIAS = [
+    """
+    CREATE TABLE IF NOT EXISTS ventas_diarias (
+        dia TEXT NOT NULL,
+        producto_id INTEGER NOT NULL,
+        unidades INTEGER NOT NULL DEFAULT 0,
+        ingresos REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (dia, producto_id)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_ventas_diarias_producto ON ventas_diarias(producto_id, dia)",
+    """
+    CREATE TRIGGER IF NOT EXISTS detalle_pedido_diarias_insert AFTER INSERT ON detalle_pedido BEGIN
+        INSERT INTO ventas_diarias (dia, producto_id, unidades, ingresos)
+        SELECT substr(p.fecha, 1, 10), new.producto_id, new.cantidad, new.cantidad * new.precio_unitario
+        FROM pedidos p WHERE p.id = new.pedido_id
+        ON CONFLICT(dia, producto_id) DO UPDATE SET unidades = unidades + excluded.unidades,
+                                                    ingresos = ingresos + excluded.ingresos;
+    END
+    """,
+    "DROP TRIGGER IF EXISTS detalle_pedido_diarias_delete",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS detalle_pedido_diarias_delete AFTER DELETE ON detalle_pedido
+    WHEN {LINEA_VIGENTE} BEGIN
+        UPDATE ventas_diarias SET unidades = unidades - old.cantidad,
+                                  ingresos = ingresos - old.cantidad * old.precio_unitario
+        WHERE producto_id = old.producto_id
+          AND dia = (SELECT substr(fecha, 1, 10) FROM pedidos WHERE id = old.pedido_id);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS pedidos_diarias_cancelar AFTER UPDATE OF estado ON pedidos
+    WHEN {CANCELACION} BEGIN
+        UPDATE ventas_diarias SET unidades = ventas_diarias.unidades - l.unidades,
+                                  ingresos = ventas_diarias.ingresos - l.ingresos
+        FROM {LINEAS_PEDIDO} AS l
+        WHERE ventas_diarias.dia = substr(new.fecha, 1, 10) AND ventas_diarias.producto_id = l.producto_id;
+    END
+    """,
+]
+
+def crear_ventas_diarias(cursor):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'ventas_diarias'")
+    existia = cursor.fetchone() is not None
+    for sentencia in VENTAS_DIARIAS:
+        cursor.execute(sentencia)
+    return existia
+
+# Pares (pedidos, detalle) del archivo y de las tablas activas
+TABLAS_PEDIDOS = (("pedidos_archivo", "detalle_pedido_archivo"), ("pedidos", "detalle_pedido"))
+
+def _sql_ventas_diarias(pedidos, detalles, por_rango):
+    rango = " AND p.id > ? AND p.id <= ?" if por_rango else ""
+    return f"""
+        INSERT INTO ventas_diarias (dia, producto_id, unidades, ingresos)
+        SELECT substr(p.fecha, 1, 10), dp.producto_id,
+               SUM(dp.cantidad), SUM(dp.cantidad * dp.precio_unitario)
+        FROM {pedidos} p
+        JOIN {detalles} dp ON dp.pedido_id = p.id
+        WHERE p.estado IS NOT 'Cancelado'{rango}
+        GROUP BY 1, 2
+        ON CONFLICT(dia, producto_id) DO UPDATE SET unidades = unidades + excluded.unidades,
+                                                    ingresos = ingresos + excluded.ingresos
+    """
+
+# Reconstrucción completa dentro de la transacción del llamador (la usan las migraciones)
+def reconstruir_ventas_diarias(cursor):
+    cursor.execute("DELETE FROM ventas_diarias")
+    for pedidos, detalles in TABLAS_PEDIDOS:
+        cursor.execute(_sql_ventas_diarias(pedidos, detalles, False))
+
+# Reconstruye ventas_diarias recorriendo los pedidos por lotes de ids, un lote por transacción,
+# primero los archivados y después los activos (no conviene archivar mientras tanto).
+# Los pedidos posteriores al inicio quedan cubiertos por los triggers.
+def backfill_ventas_diarias(conn, lote=5000):
+    cursor = conn.cursor()
+    if conn.in_transaction:
+        conn.commit()
+    cursor.execute("BEGIN IMMEDIATE")
+    topes = {}
+    for pedidos, detalles in TABLAS_PEDIDOS:
+        cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {pedidos}")
+        topes[pedidos, detalles] = cursor.fetchone()[0]
+    cursor.execute("DELETE FROM ventas_diarias")
+    conn.commit()
+
+    procesados = 0
+    for (pedidos, detalles), tope in topes.items():
+        ultimo = 0
+        while ultimo < tope:
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute(f"""
+                SELECT MAX(id), COUNT(*) FROM (
+                    SELECT id FROM {pedidos} WHERE id > ? AND id <= ? ORDER BY id LIMIT ?
+                )
+            """, (ultimo, tope, lote))
+            hasta, cantidad = cursor.fetchone()
+            if not cantidad:
+                conn.commit()
+                break
+            cursor.execute(_sql_ventas_diarias(pedidos, detalles, True), (ultimo, hasta))
+            conn.commit()
+            ultimo = hasta
+            procesados += cantidad
+    return procesados
+
+# Registro de cambios para sincronización incremental: cada alta, modificación o baja en las
+# tablas sincronizables (incluidos los movimientos de stock de los pedidos) agrega una entrada
+TABLAS_SINCRONIZABLES = ("categorias", "productos", "clientes", "pedidos")
+
+CAMBIOS = [
+    """
+    CREATE TABLE IF NOT EXISTS cambios (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        tabla TEXT NOT NULL,
+        fila_id INTEGER NOT NULL,
+        operacion TEXT NOT NULL,
+        fecha TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_cambios_fila ON cambios(tabla, fila_id, seq)",
+    # compactado_hasta: entradas con seq <= este valor ya no existen (los clientes anteriores deben resincronizar)
+    # revisado_hasta: última entrada considerada al eliminar entradas reemplazadas por otras más nuevas
+    """
+    CREATE TABLE IF NOT EXISTS cambios_estado (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        compactado_hasta INTEGER NOT NULL DEFAULT 0,
+        revisado_hasta INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    "INSERT OR IGNORE INTO cambios_estado (id, compactado_hasta, revisado_hasta) VALUES (1, 0, 0)",
+] + [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {tabla}_cambios_{evento.lower()} AFTER {evento} ON {tabla} BEGIN
+        INSERT INTO cambios (tabla, fila_id, operacion)
+        VALUES ('{tabla}', {"old" if evento == "DELETE" else "new"}.id, '{evento.lower()}');
+    END
+    """
+    for tabla in TABLAS_SINCRONIZABLES
+    for evento in ("INSERT", "UPDATE", "DELETE")
+]
+
+def crear_cambios(cursor):
+    for sentencia in CAMBIOS:
+        cursor.execute(sentencia)
+
+# Tablas principales de la tienda
+TABLAS = [
+    # Categorías
+    """
     CREATE TABLE IF NOT EXISTS categorias (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         nombre TEXT NOT NULL,
         descripcion TEXT
     )
-    """)
-    
-    # Crear tabla de productos
-    cursor.execute("""
+    """,
+    # Productos
+    """
     CREATE TABLE IF NOT EXISTS productos (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         nombre TEXT NOT NULL,
@@ -25,10 +517,9 @@ def init_database():
         imagen_url TEXT,
         FOREIGN KEY (categoria_id) REFERENCES categorias(id)
     )
-    """)
-    
-    # Crear tabla de clientes
-    cursor.execute("""
+    """,
+    # Clientes
+    """
     CREATE TABLE IF NOT EXISTS clientes (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         nombre TEXT NOT NULL,
@@ -36,10 +527,9 @@ def init_database():
         telefono TEXT,
         direccion TEXT
     )
-    """)
-    
-    # Crear tabla de pedidos
-    cursor.execute("""
+    """,
+    # Pedidos
+    """
     CREATE TABLE IF NOT EXISTS pedidos (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         cliente_id INTEGER NOT NULL,
@@ -48,10 +538,9 @@ def init_database():
         estado TEXT DEFAULT 'Pendiente',
         FOREIGN KEY (cliente_id) REFERENCES clientes(id)
     )
-    """)
-    
-    # Crear tabla de detalle de pedidos (relación muchos a muchos entre pedidos y productos)
-    cursor.execute("""
+    """,
+    # Detalle de pedidos (relación muchos a muchos entre pedidos y productos)
+    """
     CREATE TABLE IF NOT EXISTS detalle_pedido (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         pedido_id INTEGER NOT NULL,
@@ -61,7 +550,34 @@ def init_database():
         FOREIGN KEY (pedido_id) REFERENCES pedidos(id) ON DELETE CASCADE,
         FOREIGN KEY (producto_id) REFERENCES productos(id)
     )
-    """)
+    """,
+]
+
+def crear_tablas(cursor):
+    for tabla in TABLAS:
+        cursor.execute(tabla)
+
+# Índices, archivo, búsqueda, versión del catálogo, resúmenes y registro de cambios; idempotente
+# sobre bases existentes. No confirma: corre dentro de la transacción de su migración.
+def crear_esquema_derivado(cursor):
+    crear_indices(cursor)
+    crear_archivo(cursor)
+    crear_busqueda(cursor)
+    crear_version_catalogo(cursor)
+    crear_estadisticas(cursor)
+    crear_resumen_clientes(cursor)
+    if not crear_ventas_diarias(cursor):
+        reconstruir_ventas_diarias(cursor)
+    crear_cambios(cursor)
+
+def init_database(ruta="fitness_store.db"):
+    import migraciones
+
+    conn = sqlite3.connect(ruta)
+    cursor = conn.cursor()
+    
+    # Tablas, índices y tablas derivadas: las mismas migraciones que aplica la API al iniciar
+    migraciones.migrar(conn)
     
     # Verificar si ya hay datos
     cursor.execute("SELECT COUNT(*) FROM categorias")
@@ -209,5 +725,296 @@ def init_database():
     print("   - 21 detalles de pedido")
     print("\n🚀 Ejecuta 'python main.py' para iniciar el servidor FastAPI")
 
+def reconstruir(ruta="fitness_store.db"):
+    conn = sqlite3.connect(ruta)
+    cursor = conn.cursor()
+    crear_archivo(cursor)
+    crear_estadisticas(cursor)
+    crear_resumen_clientes(cursor)
+    conn.commit()
+    cursor.execute("BEGIN IMMEDIATE")
+    reconstruir_estadisticas(cursor)
+    reconstruir_resumen_clientes(cursor)
+    conn.commit()
+    conn.close()
+    print("✅ Resúmenes de estadísticas recalculados")
+
+def backfill(lote, ruta="fitness_store.db"):
+    conn = sqlite3.connect(ruta)
+    crear_archivo(conn.cursor())
+    crear_ventas_diarias(conn.cursor())
+    conn.commit()
+    procesados = backfill_ventas_diarias(conn, lote)
+    conn.close()
+    print(f"✅ ventas_diarias reconstruida a partir de {procesados} pedidos")
+
+def archivar(dias, lote, ruta="fitness_store.db"):
+    import archivo
+    import migraciones
+
+    conn = sqlite3.connect(ruta)
+    migraciones.migrar(conn)
+    resultado = archivo.archivar(conn, dias, lote)
+    conn.close()
+    print(f"✅ {resultado['archivados']} pedidos anteriores a {resultado['hasta']} archivados "
+          f"en {resultado['lotes']} lotes")
+
+# Generador de datos sintéticos a escala. Con escala 1 se crean ~1.000 productos, 10.000 clientes
+# y 30.000 pedidos; escala 100 ronda los 10 millones de filas entre todas las tablas.
+ESCALA_BASE = {"productos": 1000, "clientes": 10000, "pedidos": 30000}
+LOTE_CARGA = 50000
+
+# Durante la carga no hace falta durabilidad: si falla, se vuelve a generar
+PRAGMAS_CARGA = (
+    "PRAGMA journal_mode = OFF",
+    "PRAGMA synchronous = OFF",
+    "PRAGMA locking_mode = EXCLUSIVE",
+    "PRAGMA cache_size = -262144",
+    "PRAGMA temp_store = MEMORY",
+)
+
+CATEGORIAS_GENERADAS = [
+    ("Proteínas", "Suplementos proteicos para construcción muscular", ["Whey Protein", "Proteína Vegana", "Caseína"]),
+    ("Pre-Entreno", "Suplementos energéticos para antes del entrenamiento", ["Pre-Workout", "Beta Alanina", "Óxido Nítrico"]),
+    ("Vitaminas", "Suplementos vitamínicos y minerales", ["Multivitamínico", "Vitamina D3", "ZMA"]),
+    ("Creatina", "Suplementos de creatina para fuerza y rendimiento", ["Creatina Monohidrato", "Creatina HCL"]),
+    ("Aminoácidos", "BCAA y otros aminoácidos esenciales", ["BCAA 2:1:1", "Glutamina", "EAA"]),
+    ("Quemadores", "Termogénicos y control de peso", ["L-Carnitina", "Termogénico", "CLA"]),
+    ("Ganadores de Peso", "Fórmulas hipercalóricas", ["Mass Gainer", "Carbohidratos Complejos"]),
+    ("Salud Articular", "Colágeno y protectores articulares", ["Colágeno Hidrolizado", "Glucosamina"]),
+    ("Omegas", "Ácidos grasos esenciales", ["Omega 3", "Aceite de Krill"]),
+    ("Snacks", "Barras y snacks proteicos", ["Barra Proteica", "Cookie Proteica"]),
+]
+MARCAS = ["Star Nutrition", "ENA", "Gentech", "Xtrenght", "Body Advance", "Optimum", "MuscleTech", "Ultra Tech"]
+SABORES = ["Chocolate", "Vainilla", "Frutilla", "Cookies", "Banana", "Neutro", "Limón", "Frutos Rojos"]
+PRESENTACIONES = ["300g", "500g", "1kg", "2lb", "5lb", "60 cáps.", "120 cáps.", "30 servicios"]
+NOMBRES = ["Juan", "María", "Carlos", "Ana", "Luis", "Laura", "Diego", "Sofía", "Martín", "Valentina",
+           "Fernando", "Carolina", "Lucas", "Camila", "Mateo", "Julieta", "Nicolás", "Agustina"]
+APELLIDOS = ["Pérez", "González", "Rodríguez", "Martínez", "Fernández", "Sánchez", "Ramírez", "Torres",
+             "López", "Castro", "Díaz", "Ruiz", "Gómez", "Romero", "Álvarez", "Herrera"]
+CALLES = ["Av. Aconquija", "San Martín", "Av. Mate de Luna", "Las Heras", "Av. Roca", "Córdoba",
+          "Av. Sarmiento", "25 de Mayo", "Av. Belgrano", "Muñecas"]
+CIUDADES = ["Tucumán", "Yerba Buena", "Tafí Viejo", "Banda del Río Salí", "Salta", "Córdoba"]
+
+# Líneas por pedido (1 a 5) y unidades por línea, con sus pesos relativos
+PESOS_LINEAS = [40, 30, 15, 10, 5]
+PESOS_CANTIDAD = [70, 20, 10]
+
+FECHA_INICIO = date(2023, 1, 1)
+FECHA_FIN = date(2024, 12, 31)
+
+# Índice sesgado hacia el inicio del rango: con sesgo 2 el primer 10% concentra ~32% de las elecciones
+def indice_sesgado(azar, n, sesgo):
+    return int(n * azar.random() ** sesgo)
+
+# Peso de cada día: picos en enero (propósitos de año nuevo) y noviembre-diciembre, menos ventas el fin de semana
+def peso_dia(dia):
+    peso = 1.0
+    if dia.month == 1:
+        peso *= 1.6
+    elif dia.month in (11, 12):
+        peso *= 1.4 + (0.6 if dia.month == 11 and dia.day >= 25 else 0)
+    elif dia.month in (6, 7):
+        peso *= 0.8
+    if dia.weekday() >= 5:
+        peso *= 0.7
+    return peso
+
+def estado_por_antiguedad(dias_hasta_fin):
+    if dias_hasta_fin < 2:
+        return "Pendiente"
+    if dias_hasta_fin < 7:
+        return "En Proceso"
+    return "Completado"
+
+def en_lotes(filas, tamano=LOTE_CARGA):
+    lote = []
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) >= tamano:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+def generar_categorias(cantidad):
+    for i in range(cantidad):
+        if i < len(CATEGORIAS_GENERADAS):
+            nombre, descripcion, _ = CATEGORIAS_GENERADAS[i]
+        else:
+            nombre, descripcion = f"Categoría {i + 1}", f"Categoría generada {i + 1}"
+        yield (i + 1, nombre, descripcion)
+
+def generar_productos(azar, cantidad, categorias, precios):
+    for producto_id in range(1, cantidad + 1):
+        categoria = azar.randrange(categorias)
+        tipos = CATEGORIAS_GENERADAS[categoria % len(CATEGORIAS_GENERADAS)][2]
+        tipo, marca = azar.choice(tipos), azar.choice(MARCAS)
+        sabor, presentacion = azar.choice(SABORES), azar.choice(PRESENTACIONES)
+        precio = round(min(max(azar.lognormvariate(8.0, 0.45), 400), 40000), 2)
+        precios.append(precio)
+        yield (producto_id, f"{tipo} {marca} {sabor} {presentacion}",
+               f"{tipo} de {marca}, sabor {sabor.lower()}, presentación {presentacion}",
+               precio, azar.randint(0, 500), categoria + 1, None)
+
+def generar_clientes(azar, cantidad):
+    for cliente_id in range(1, cantidad + 1):
+        yield (cliente_id, f"{azar.choice(NOMBRES)} {azar.choice(APELLIDOS)}",
+               f"cliente{cliente_id}@ejemplo.test", f"381-{azar.randrange(10 ** 7):07d}",
+               f"{azar.choice(CALLES)} {azar.randint(1, 3000)}, {azar.choice(CIUDADES)}")
+
+# Genera (pedido, detalles) en orden de fecha, de modo que los ids crecen con la fecha
+def generar_pedidos(azar, cantidad, clientes, precios):
+    dias = [FECHA_INICIO + timedelta(days=i) for i in range((FECHA_FIN - FECHA_INICIO).days + 1)]
+    pedidos_por_dia = [0] * len(dias)
+    for i in azar.choices(range(len(dias)), weights=[peso_dia(dia) for dia in dias], k=cantidad):
+        pedidos_por_dia[i] += 1
+
+    productos = len(precios)
+    lineas_posibles = range(1, min(len(PESOS_LINEAS), productos) + 1)
+    pesos_lineas = PESOS_LINEAS[:len(lineas_posibles)]
+    pedido_id = 0
+    detalle_id = 0
+    for dia, cantidad_dia in zip(dias, pedidos_por_dia):
+        estado = estado_por_antiguedad((FECHA_FIN - dia).days)
+        prefijo = dia.isoformat()
+        for segundo in sorted(azar.randrange(86400) for _ in range(cantidad_dia)):
+            pedido_id += 1
+            elegidos = set()
+            objetivo = azar.choices(lineas_posibles, pesos_lineas)[0]
+            while len(elegidos) < objetivo:
+                elegidos.add(indice_sesgado(azar, productos, 2))
+            detalles = []
+            total = 0.0
+            for indice in elegidos:
+                detalle_id += 1
+                cantidad_linea = azar.choices((1, 2, 3), PESOS_CANTIDAD)[0]
+                total += cantidad_linea * precios[indice]
+                detalles.append((detalle_id, pedido_id, indice + 1, cantidad_linea, precios[indice]))
+            fecha = f"{prefijo} {segundo // 3600:02d}:{segundo // 60 % 60:02d}:{segundo % 60:02d}"
+            cliente_id = indice_sesgado(azar, clientes, 1.5) + 1
+            yield (pedido_id, cliente_id, fecha, round(total, 2), estado), detalles
+
+def _cargar(conn, sql, filas):
+    cantidad = 0
+    for lote in en_lotes(filas):
+        conn.executemany(sql, lote)
+        cantidad += len(lote)
+    return cantidad
+
+def _informar(nombre, filas, segundos):
+    print(f"   - {nombre}: {filas:,} filas en {segundos:.1f}s ({filas / max(segundos, 1e-9):,.0f} filas/s)")
+
+# Crea una base nueva con datos sintéticos deterministas (misma semilla, mismos datos).
+# Los índices, triggers y tablas derivadas se crean recién después de cargar las tablas principales.
+def generar_base(ruta, productos, clientes, pedidos, categorias=10, semilla=42, forzar=False):
+    import migraciones
+
+    if os.path.exists(ruta):
+        if not forzar:
+            raise SystemExit(f"❌ {ruta} ya existe; use --forzar para reemplazarla")
+        for sufijo in ("", "-wal", "-shm", "-journal"):
+            if os.path.exists(ruta + sufijo):
+                os.remove(ruta + sufijo)
+
+    azar = random.Random(semilla)
+    inicio_total = time.perf_counter()
+    conn = sqlite3.connect(ruta, isolation_level=None)
+    for pragma in PRAGMAS_CARGA:
+        conn.execute(pragma)
+    crear_tablas(conn.cursor())
+    print(f"📦 Generando datos (semilla {semilla}) en {ruta}")
+
+    total_filas = 0
+    precios = []
+    tablas = [
+        ("categorias", "INSERT INTO categorias (id, nombre, descripcion) VALUES (?, ?, ?)",
+         generar_categorias(categorias)),
+        ("productos", """
+            INSERT INTO productos (id, nombre, descripcion, precio, stock, categoria_id, imagen_url)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, generar_productos(azar, productos, categorias, precios)),
+        ("clientes", "INSERT INTO clientes (id, nombre, email, telefono, direccion) VALUES (?, ?, ?, ?, ?)",
+         generar_clientes(azar, clientes)),
+    ]
+    for nombre, sql, filas in tablas:
+        inicio = time.perf_counter()
+        conn.execute("BEGIN")
+        cantidad = _cargar(conn, sql, filas)
+        conn.execute("COMMIT")
+        _informar(nombre, cantidad, time.perf_counter() - inicio)
+        total_filas += cantidad
+
+    inicio = time.perf_counter()
+    cantidad_pedidos = 0
+    cantidad_detalles = 0
+    conn.execute("BEGIN")
+    for lote in en_lotes(generar_pedidos(azar, pedidos, clientes, precios)):
+        conn.executemany("INSERT INTO pedidos (id, cliente_id, fecha, total, estado) VALUES (?, ?, ?, ?, ?)",
+                         [pedido for pedido, _ in lote])
+        detalles = [detalle for _, lineas in lote for detalle in lineas]
+        conn.executemany("""
+            INSERT INTO detalle_pedido (id, pedido_id, producto_id, cantidad, precio_unitario)
+            VALUES (?, ?, ?, ?, ?)
+        """, detalles)
+        cantidad_pedidos += len(lote)
+        cantidad_detalles += len(detalles)
+    conn.execute("COMMIT")
+    _informar("pedidos + detalle_pedido", cantidad_pedidos + cantidad_detalles, time.perf_counter() - inicio)
+    print(f"     ({cantidad_pedidos:,} pedidos, {cantidad_detalles:,} detalles)")
+    total_filas += cantidad_pedidos + cantidad_detalles
+
+    inicio = time.perf_counter()
+    conn.isolation_level = ""
+    migraciones.migrar(conn)
+    conn.execute("ANALYZE")
+    conn.commit()
+    print(f"   - índices, búsqueda, resúmenes y ventas diarias: {time.perf_counter() - inicio:.1f}s")
+    conn.close()
+
+    # Se deja la base en el modo que usa la API
+    conn = sqlite3.connect(ruta)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.close()
+
+    segundos = time.perf_counter() - inicio_total
+    print(f"✅ {total_filas:,} filas en {segundos:.1f}s ({total_filas / segundos:,.0f} filas/s en total)")
+    return {"productos": productos, "clientes": clientes, "pedidos": cantidad_pedidos, "detalles": cantidad_detalles}
+
 if __name__ == "__main__":
-    init_database()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Inicializa la base de datos de la tienda")
+    parser.add_argument("--db", default="fitness_store.db", help="ruta de la base de datos")
+    parser.add_argument("--reconstruir-estadisticas", action="store_true",
+                        help="recalcula los resúmenes del dashboard y de clientes desde los pedidos")
+    parser.add_argument("--backfill-ventas", action="store_true",
+                        help="reconstruye la tabla ventas_diarias por lotes")
+    parser.add_argument("--archivar", type=int, metavar="DIAS",
+                        help="mueve al archivo los pedidos completados o cancelados con más de DIAS días")
+    parser.add_argument("--lote", type=int, default=5000,
+                        help="pedidos por transacción durante el backfill o el archivado")
+    parser.add_argument("--generar", action="store_true",
+                        help="crea una base nueva con datos sintéticos a escala")
+    parser.add_argument("--escala", type=float, default=1.0,
+                        help="multiplicador de ESCALA_BASE (100 ≈ 10 millones de filas)")
+    parser.add_argument("--productos", type=int, help="cantidad de productos (reemplaza la escala)")
+    parser.add_argument("--clientes", type=int, help="cantidad de clientes (reemplaza la escala)")
+    parser.add_argument("--pedidos", type=int, help="cantidad de pedidos (reemplaza la escala)")
+    parser.add_argument("--categorias", type=int, default=10)
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--forzar", action="store_true", help="reemplaza la base si ya existe")
+    args = parser.parse_args()
+    if args.generar:
+        cantidades = {
+            nombre: getattr(args, nombre) or max(1, int(base * args.escala))
+            for nombre, base in ESCALA_BASE.items()
+        }
+        generar_base(args.db, categorias=args.categorias, semilla=args.semilla,
+                     forzar=args.forzar, **cantidades)
+    elif args.reconstruir_estadisticas:
+        reconstruir(args.db)
+    elif args.backfill_ventas:
+        backfill(args.lote, args.db)
+    elif args.archivar is not None:
+        archivar(args.archivar, args.lote, args.db)
+    else:
+        init_database(args.db)
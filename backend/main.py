@@ -1,11 +1,78 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Response, Query, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, Field
 from typing import Optional, List
-import sqlite3
 from datetime import datetime
+import asyncio
+import json
+import os
+import sqlite3
+import time
+
+from db import pool, get_db, transaccion, PoolAgotado
+from paginacion import ConsultaPaginada, CursorInvalido, LIMITE_POR_DEFECTO, LIMITE_MAXIMO
+from busqueda import consulta_fts, PESOS
+from cache import catalogo, clave_request
+from escritor import EscritorAgrupado
+from asincrono import EjecutorDB, ClienteDesconectado
+from arranque import Arranque
+import analitica
+import archivo
+import cambios
+import cotizacion
+import estados
+import imagenes
+import exportacion
+import importacion
+import metricas
+
+# Modo de escritura de pedidos: "lotes" activa el escritor único con group commit
+ESCRITOR_PEDIDOS = os.environ.get("FITNESS_ORDER_WRITER", "directo")
+escritor = EscritorAgrupado(pool) if ESCRITOR_PEDIDOS == "lotes" else None
+# Las rutas async hacen su trabajo con SQLite en este executor, no en el threadpool de Starlette
+bd = EjecutorDB(pool)
+compactador = cambios.CompactadorCambios(pool)
+vigia_cambios = cambios.VigiaCambios(pool)
+snapshot_catalogo = cotizacion.SnapshotCatalogo(pool)
+arranque = Arranque()
+almacen_imagenes = imagenes.AlmacenImagenes()
+# Con FITNESS_IMAGES_PREWARM=1 las variantes de todo el catálogo se generan en segundo plano al iniciar
+PREGENERAR_IMAGENES = os.environ.get("FITNESS_IMAGES_PREWARM", "0") == "1"
 
-app = FastAPI()
+# Streams SSE de cambios: cada cuánto se busca algo nuevo y cada cuánto se envía un keep-alive
+SSE_INTERVALO = 0.5
+SSE_KEEPALIVE = 15
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Migraciones y estadísticas del planificador antes de abrir conexiones y de aceptar peticiones
+    arranque.preparar_base(pool.ruta)
+    # Las conexiones se abren y configuran una sola vez al iniciar
+    pool.abrir()
+    bd.iniciar()
+    if escritor is not None:
+        escritor.iniciar()
+    compactador.iniciar()
+    snapshot_catalogo.iniciar()
+    if PREGENERAR_IMAGENES:
+        pregenerar_variantes()
+    # La app ya sirve mientras se calienta; /ready indica cuándo terminó
+    calentamiento = asyncio.create_task(arranque.calentar(app, pool, bd))
+    yield
+    calentamiento.cancel()
+    almacen_imagenes.detener()
+    # Antes que el escritor: las escrituras ya encoladas en el executor terminan
+    bd.detener()
+    snapshot_catalogo.detener()
+    compactador.detener()
+    if escritor is not None:
+        escritor.detener()
+    pool.cerrar()
+
+app = FastAPI(lifespan=lifespan)
 
 # Configuración de CORS
 app.add_middleware(
@@ -14,13 +81,94 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
-# Conexión a la base de datos
-def get_db():
-    conn = sqlite3.connect("fitness_store.db")
-    conn.row_factory = sqlite3.Row
-    return conn
+if metricas.HABILITADAS:
+    app.add_middleware(metricas.MiddlewareMetricas)
+
+@app.exception_handler(PoolAgotado)
+def pool_agotado_handler(request: Request, exc: PoolAgotado):
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
+
+@app.exception_handler(exportacion.ExportacionesAgotadas)
+def exportaciones_agotadas_handler(request: Request, exc: exportacion.ExportacionesAgotadas):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "5"})
+
+# Nadie recibirá la respuesta; 499 (convención de nginx) deja constancia en las métricas
+@app.exception_handler(ClienteDesconectado)
+def cliente_desconectado_handler(request: Request, exc: ClienteDesconectado):
+    return Response(status_code=499)
+
+@app.exception_handler(estados.TransicionInvalida)
+def transicion_invalida_handler(request: Request, exc: estados.TransicionInvalida):
+    return JSONResponse(status_code=409, content={"detail": str(exc)})
+
+@app.exception_handler(imagenes.ImagenNoEncontrada)
+def imagen_no_encontrada_handler(request: Request, exc: imagenes.ImagenNoEncontrada):
+    return JSONResponse(status_code=404, content={"detail": "Imagen no encontrada"})
+
+@app.exception_handler(CursorInvalido)
+def cursor_invalido_handler(request: Request, exc: CursorInvalido):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+def pagina(conn, consulta, orden, direccion, limit, cursor):
+    filas, siguiente = consulta.ejecutar(conn, orden, direccion == "desc", limit, cursor)
+    headers = {"X-Next-Cursor": siguiente} if siguiente else {}
+    return [dict(row) for row in filas], headers
+
+async def paginar(request, consulta, response, orden, direccion, limit, cursor):
+    resultado, headers = await bd.leer(request, pagina, consulta, orden, direccion, limit, cursor)
+    response.headers.update(headers)
+    return resultado
+
+# Campos de cada listado, en el orden de sus columnas; ?fields= elige un subconjunto
+CAMPOS_PRODUCTO = ("id", "nombre", "descripcion", "precio", "stock", "categoria_id", "imagen_url", "categoria_nombre")
+CAMPOS_CLIENTE = ("id", "nombre", "email", "telefono", "direccion")
+CAMPOS_PEDIDO = ("id", "cliente_id", "fecha", "total", "estado", "cliente_nombre", "cliente_email")
+
+def proyeccion(fields, permitidos):
+    if fields is None:
+        return permitidos
+    campos = tuple(dict.fromkeys(campo.strip() for campo in fields.split(",") if campo.strip()))
+    desconocidos = [campo for campo in campos if campo not in permitidos]
+    if desconocidos or not campos:
+        raise HTTPException(status_code=400, detail=f"Campos inválidos: {', '.join(desconocidos) or fields}. "
+                                                    f"Disponibles: {', '.join(permitidos)}")
+    return campos
+
+# Ruta rápida de los listados: SQLite devuelve cada fila ya en JSON y se envían los bytes tal cual
+def pagina_json(conn, consulta, orden, direccion, limit, cursor, campos):
+    cuerpo, siguiente = consulta.ejecutar_json(conn, orden, direccion == "desc", limit, cursor, campos)
+    headers = {"X-Next-Cursor": siguiente} if siguiente else {}
+    return cuerpo, headers
+
+async def paginar_json(request, consulta, orden, direccion, limit, cursor, campos):
+    cuerpo, headers = await bd.leer(request, pagina_json, consulta, orden, direccion, limit, cursor, campos)
+    return Response(cuerpo, media_type="application/json", headers=headers)
+
+# Ejecuta una escritura en su propia transacción o, si está activo, en el escritor por lotes
+def escribir(operacion):
+    try:
+        if escritor is not None:
+            return escritor.ejecutar(operacion)
+        with transaccion() as conn:
+            return operacion(conn)
+    finally:
+        snapshot_catalogo.avisar()
+
+# Respuestas del catálogo servidas desde la caché mientras no cambie la versión
+async def respuesta_catalogo(request, construir):
+    clave = clave_request(request)
+    def consultar(conn):
+        version = catalogo.version(conn)
+        entrada = catalogo.obtener(clave, version)
+        if entrada is None:
+            datos, headers = construir(conn)
+            entrada = catalogo.guardar(clave, version, datos, headers)
+        return entrada
+    entrada = await bd.leer(request, consultar)
+    return entrada.respuesta(request)
 
 # Modelos Pydantic
 class ProductCreate(BaseModel):
@@ -51,59 +199,137 @@ class ClienteUpdate(BaseModel):
     telefono: Optional[str] = None
     direccion: Optional[str] = None
 
+class PedidoItem(BaseModel):
+    producto_id: int
+    cantidad: int = Field(gt=0)
+
 class PedidoCreate(BaseModel):
     cliente_id: int
-    productos: List[dict]  # [{"producto_id": 1, "cantidad": 2}, ...]
+    productos: List[PedidoItem] = Field(min_length=1)
+    # Versión devuelta por /pedidos/quote: si el catálogo no cambió, no se vuelven a leer los productos
+    version: Optional[int] = None
+
+class CotizacionCreate(BaseModel):
+    productos: List[PedidoItem] = Field(min_length=1)
+
+PATRON_ESTADO = "^(" + "|".join(estados.ESTADOS) + ")$"
+
+class EstadoUpdate(BaseModel):
+    estado: str = Field(pattern=PATRON_ESTADO)
+
+class EstadosBulk(BaseModel):
+    ids: List[int] = Field(min_length=1, max_length=100000)
+    estado: str = Field(pattern=PATRON_ESTADO)
+
+class CancelacionBulk(BaseModel):
+    ids: List[int] = Field(min_length=1, max_length=100000)
 
 # Endpoints de Productos
 @app.get("/productos")
-def get_productos():
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("""
+async def get_productos(
+    request: Request,
+    categoria_id: Optional[int] = None,
+    precio_min: Optional[float] = None,
+    precio_max: Optional[float] = None,
+    stock_min: Optional[int] = None,
+    stock_max: Optional[int] = None,
+    orden: str = Query("id", pattern="^(id|nombre|precio|stock)$"),
+    direccion: str = Query("asc", pattern="^(asc|desc)$"),
+    limit: int = Query(LIMITE_POR_DEFECTO, ge=1, le=LIMITE_MAXIMO),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+):
+    campos = proyeccion(fields, CAMPOS_PRODUCTO)
+    consulta = ConsultaPaginada("""
         SELECT p.*, c.nombre as categoria_nombre 
         FROM productos p
         LEFT JOIN categorias c ON p.categoria_id = c.id
-    """)
-    productos = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return productos
+    """, {"id": "p.id", "nombre": "p.nombre", "precio": "p.precio", "stock": "p.stock"}, "p.id")
+    if categoria_id is not None:
+        consulta.filtrar("p.categoria_id = ?", categoria_id)
+    if precio_min is not None:
+        consulta.filtrar("p.precio >= ?", precio_min)
+    if precio_max is not None:
+        consulta.filtrar("p.precio <= ?", precio_max)
+    if stock_min is not None:
+        consulta.filtrar("p.stock >= ?", stock_min)
+    if stock_max is not None:
+        consulta.filtrar("p.stock <= ?", stock_max)
+    return await respuesta_catalogo(
+        request, lambda conn: pagina_json(conn, consulta, orden, direccion, limit, cursor, campos))
 
-@app.get("/productos/{producto_id}")
-def get_producto(producto_id: int):
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT p.*, c.nombre as categoria_nombre 
-        FROM productos p
+@app.get("/productos/search")
+async def search_productos(
+    request: Request,
+    q: str = Query(..., min_length=1),
+    categoria_id: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=LIMITE_MAXIMO),
+):
+    expresion = consulta_fts(q)
+    if expresion is None:
+        return []
+    sql = f"""
+        SELECT p.*, c.nombre as categoria_nombre,
+               bm25(productos_fts, {PESOS[0]}, {PESOS[1]}) as relevancia
+        FROM productos_fts
+        JOIN productos p ON p.id = productos_fts.rowid
         LEFT JOIN categorias c ON p.categoria_id = c.id
-        WHERE p.id = ?
-    """, (producto_id,))
-    producto = cursor.fetchone()
-    conn.close()
-    if not producto:
-        raise HTTPException(status_code=404, detail="Producto no encontrado")
-    return dict(producto)
+        WHERE productos_fts MATCH ?
+    """
+    parametros = [expresion]
+    if categoria_id is not None:
+        sql += " AND p.categoria_id = ?"
+        parametros.append(categoria_id)
+    sql += " ORDER BY relevancia LIMIT ?"
+    parametros.append(limit)
+    return await bd.leer(request, lambda conn: [dict(row) for row in conn.execute(sql, parametros).fetchall()])
+
+@app.get("/productos/{producto_id}")
+async def get_producto(producto_id: int, request: Request):
+    def construir(conn):
+        producto = conn.execute("""
+            SELECT p.*, c.nombre as categoria_nombre 
+            FROM productos p
+            LEFT JOIN categorias c ON p.categoria_id = c.id
+            WHERE p.id = ?
+        """, (producto_id,)).fetchone()
+        if not producto:
+            raise HTTPException(status_code=404, detail="Producto no encontrado")
+        return dict(producto), {}
+    return await respuesta_catalogo(request, construir)
 
 @app.post("/productos")
 def create_producto(producto: ProductCreate):
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO productos (nombre, descripcion, precio, stock, categoria_id, imagen_url)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (producto.nombre, producto.descripcion, producto.precio, 
-          producto.stock, producto.categoria_id, producto.imagen_url))
-    conn.commit()
-    producto_id = cursor.lastrowid
-    conn.close()
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO productos (nombre, descripcion, precio, stock, categoria_id, imagen_url)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (producto.nombre, producto.descripcion, producto.precio, 
+              producto.stock, producto.categoria_id, producto.imagen_url))
+        conn.commit()
+        producto_id = cursor.lastrowid
     return {"id": producto_id, "message": "Producto creado exitosamente"}
 
+# Carga masiva: NDJSON o CSV, procesado en lotes con reporte de errores por fila
+@app.post("/productos/bulk")
+def bulk_productos(
+    archivo: UploadFile = File(...),
+    formato: Optional[str] = Query(None, pattern="^(ndjson|csv)$"),
+):
+    formato = importacion.detectar_formato(formato, archivo.filename, archivo.content_type)
+    return importacion.importar_productos(archivo.file, formato)
+
+@app.post("/productos/bulk/ajustes")
+def bulk_ajustes_productos(
+    archivo: UploadFile = File(...),
+    formato: Optional[str] = Query(None, pattern="^(ndjson|csv)$"),
+):
+    formato = importacion.detectar_formato(formato, archivo.filename, archivo.content_type)
+    return importacion.ajustar_productos(archivo.file, formato)
+
 @app.put("/productos/{producto_id}")
 def update_producto(producto_id: int, producto: ProductUpdate):
-    conn = get_db()
-    cursor = conn.cursor()
-    
     updates = []
     values = []
     
@@ -132,78 +358,139 @@ def update_producto(producto_id: int, producto: ProductUpdate):
     values.append(producto_id)
     query = f"UPDATE productos SET {', '.join(updates)} WHERE id = ?"
     
-    cursor.execute(query, values)
-    conn.commit()
-    conn.close()
+    with get_db() as conn:
+        conn.execute(query, values)
+        conn.commit()
     return {"message": "Producto actualizado exitosamente"}
 
 @app.delete("/productos/{producto_id}")
 def delete_producto(producto_id: int):
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM productos WHERE id = ?", (producto_id,))
-    conn.commit()
-    conn.close()
+    with get_db() as conn:
+        conn.execute("DELETE FROM productos WHERE id = ?", (producto_id,))
+        conn.commit()
     return {"message": "Producto eliminado exitosamente"}
 
 # Endpoints de Categorías
 @app.get("/categorias")
-def get_categorias():
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM categorias")
-    categorias = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return categorias
+async def get_categorias(request: Request):
+    def construir(conn):
+        categorias = [dict(row) for row in conn.execute("SELECT * FROM categorias").fetchall()]
+        return categorias, {}
+    return await respuesta_catalogo(request, construir)
 
 # Endpoints de Clientes
 @app.get("/clientes")
-def get_clientes():
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM clientes")
-    clientes = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return clientes
+async def get_clientes(
+    request: Request,
+    orden: str = Query("id", pattern="^(id|nombre)$"),
+    direccion: str = Query("asc", pattern="^(asc|desc)$"),
+    limit: int = Query(LIMITE_POR_DEFECTO, ge=1, le=LIMITE_MAXIMO),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+):
+    campos = proyeccion(fields, CAMPOS_CLIENTE)
+    consulta = ConsultaPaginada("SELECT * FROM clientes",
+                                {"id": "id", "nombre": "nombre"}, "id")
+    return await paginar_json(request, consulta, orden, direccion, limit, cursor, campos)
 
 @app.get("/clientes/{cliente_id}")
-def get_cliente(cliente_id: int):
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM clientes WHERE id = ?", (cliente_id,))
-    cliente = cursor.fetchone()
-    conn.close()
+async def get_cliente(cliente_id: int, request: Request):
+    cliente = await bd.leer(
+        request, lambda conn: conn.execute("SELECT * FROM clientes WHERE id = ?", (cliente_id,)).fetchone())
     if not cliente:
         raise HTTPException(status_code=404, detail="Cliente no encontrado")
     return dict(cliente)
 
+# Historial de compras de un cliente: una página de pedidos por fecha y todas sus líneas en
+# una sola consulta, ambas resueltas con índices cubrientes
+@app.get("/clientes/{cliente_id}/pedidos")
+async def get_cliente_pedidos(
+    cliente_id: int,
+    request: Request,
+    response: Response,
+    direccion: str = Query("desc", pattern="^(asc|desc)$"),
+    limit: int = Query(20, ge=1, le=LIMITE_MAXIMO),
+    cursor: Optional[str] = None,
+):
+    consulta = ConsultaPaginada("SELECT p.id, p.fecha, p.total, p.estado FROM pedidos p",
+                                {"fecha": "p.fecha"}, "p.id")
+    consulta.filtrar("p.cliente_id = ?", cliente_id)
+    def consultar(conn):
+        cliente = conn.execute("""
+            SELECT c.*, COALESCE(r.pedidos, 0) as pedidos, COALESCE(r.total_gastado, 0) as total_gastado,
+                   r.primer_pedido, r.ultimo_pedido
+            FROM clientes c
+            LEFT JOIN resumen_clientes r ON r.cliente_id = c.id
+            WHERE c.id = ?
+        """, (cliente_id,)).fetchone()
+        if not cliente:
+            raise HTTPException(status_code=404, detail="Cliente no encontrado")
+        pedidos, headers = pagina(conn, consulta, "fecha", direccion, limit, cursor)
+        
+        detalles = {pedido["id"]: [] for pedido in pedidos}
+        if detalles:
+            marcadores = ", ".join("?" * len(detalles))
+            for row in conn.execute(f"""
+                SELECT dp.pedido_id, dp.producto_id, pr.nombre as producto_nombre,
+                       dp.cantidad, dp.precio_unitario
+                FROM detalle_pedido dp
+                LEFT JOIN productos pr ON pr.id = dp.producto_id
+                WHERE dp.pedido_id IN ({marcadores})
+            """, list(detalles)):
+                linea = dict(row)
+                detalles[linea.pop("pedido_id")].append(linea)
+        return cliente, pedidos, headers, detalles
+    cliente, pedidos, headers, detalles = await bd.leer(request, consultar)
+    
+    response.headers.update(headers)
+    cliente = dict(cliente)
+    resumen = {campo: cliente.pop(campo) for campo in ("pedidos", "total_gastado", "primer_pedido", "ultimo_pedido")}
+    for pedido in pedidos:
+        pedido["detalles"] = detalles[pedido["id"]]
+    return {"cliente": cliente, "resumen": resumen, "pedidos": pedidos}
+
+def email_registrado(conn, email, excluir_id=None):
+    return conn.execute(
+        "SELECT 1 FROM clientes WHERE lower(email) = ? AND id IS NOT ?", (email, excluir_id)
+    ).fetchone() is not None
+
 @app.post("/clientes")
 def create_cliente(cliente: ClienteCreate):
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO clientes (nombre, email, telefono, direccion)
-        VALUES (?, ?, ?, ?)
-    """, (cliente.nombre, cliente.email, cliente.telefono, cliente.direccion))
-    conn.commit()
-    cliente_id = cursor.lastrowid
-    conn.close()
+    email = importacion.normalizar_email(cliente.email)
+    with get_db() as conn:
+        if email_registrado(conn, email):
+            raise HTTPException(status_code=409, detail="Ya existe un cliente con ese email")
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO clientes (nombre, email, telefono, direccion)
+            VALUES (?, ?, ?, ?)
+        """, (cliente.nombre, email, cliente.telefono, cliente.direccion))
+        conn.commit()
+        cliente_id = cursor.lastrowid
     return {"id": cliente_id, "message": "Cliente registrado exitosamente"}
 
+@app.post("/clientes/bulk")
+def bulk_clientes(
+    archivo: UploadFile = File(...),
+    formato: Optional[str] = Query(None, pattern="^(ndjson|csv)$"),
+    actualizar: bool = False,
+):
+    formato = importacion.detectar_formato(formato, archivo.filename, archivo.content_type)
+    return importacion.importar_clientes(archivo.file, formato, actualizar)
+
 @app.put("/clientes/{cliente_id}")
 def update_cliente(cliente_id: int, cliente: ClienteUpdate):
-    conn = get_db()
-    cursor = conn.cursor()
-    
     updates = []
     values = []
     
     if cliente.nombre is not None:
         updates.append("nombre = ?")
         values.append(cliente.nombre)
+    email = None
     if cliente.email is not None:
+        email = importacion.normalizar_email(cliente.email)
         updates.append("email = ?")
-        values.append(cliente.email)
+        values.append(email)
     if cliente.telefono is not None:
         updates.append("telefono = ?")
         values.append(cliente.telefono)
@@ -217,143 +504,448 @@ def update_cliente(cliente_id: int, cliente: ClienteUpdate):
     values.append(cliente_id)
     query = f"UPDATE clientes SET {', '.join(updates)} WHERE id = ?"
     
-    cursor.execute(query, values)
-    conn.commit()
-    conn.close()
+    with get_db() as conn:
+        if email is not None and email_registrado(conn, email, cliente_id):
+            raise HTTPException(status_code=409, detail="Ya existe un cliente con ese email")
+        conn.execute(query, values)
+        conn.commit()
     return {"message": "Cliente actualizado exitosamente"}
 
 @app.delete("/clientes/{cliente_id}")
 def delete_cliente(cliente_id: int):
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM clientes WHERE id = ?", (cliente_id,))
-    conn.commit()
-    conn.close()
+    with get_db() as conn:
+        conn.execute("DELETE FROM clientes WHERE id = ?", (cliente_id,))
+        conn.commit()
     return {"message": "Cliente eliminado exitosamente"}
 
 # Endpoints de Pedidos
 @app.get("/pedidos")
-def get_pedidos():
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("""
+async def get_pedidos(
+    request: Request,
+    cliente_id: Optional[int] = None,
+    desde: Optional[str] = None,
+    hasta: Optional[str] = None,
+    estado: Optional[str] = None,
+    orden: str = Query("fecha", pattern="^(id|fecha|total)$"),
+    direccion: str = Query("desc", pattern="^(asc|desc)$"),
+    limit: int = Query(LIMITE_POR_DEFECTO, ge=1, le=LIMITE_MAXIMO),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+):
+    campos = proyeccion(fields, CAMPOS_PEDIDO)
+    consulta = ConsultaPaginada("""
         SELECT p.*, c.nombre as cliente_nombre, c.email as cliente_email
         FROM pedidos p
         LEFT JOIN clientes c ON p.cliente_id = c.id
-        ORDER BY p.fecha DESC
-    """)
-    pedidos = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return pedidos
+    """, {"id": "p.id", "fecha": "p.fecha", "total": "p.total"}, "p.id")
+    if cliente_id is not None:
+        consulta.filtrar("p.cliente_id = ?", cliente_id)
+    # Las fechas se guardan como texto 'YYYY-MM-DD HH:MM:SS', por lo que se comparan lexicográficamente
+    if desde is not None:
+        consulta.filtrar("p.fecha >= ?", desde)
+    if hasta is not None:
+        # Una fecha sin hora incluye el día completo
+        if len(hasta) == 10:
+            hasta += " 23:59:59"
+        consulta.filtrar("p.fecha <= ?", hasta)
+    if estado is not None:
+        consulta.filtrar("p.estado = ?", estado)
+    return await paginar_json(request, consulta, orden, direccion, limit, cursor, campos)
 
-@app.get("/pedidos/{pedido_id}")
-def get_pedido(pedido_id: int):
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    # Obtener información del pedido
-    cursor.execute("""
+# Pedidos por preparar, del más antiguo al más nuevo; usa el índice parcial de pedidos abiertos
+@app.get("/pedidos/pendientes")
+async def get_pedidos_pendientes(
+    request: Request,
+    response: Response,
+    estado: Optional[str] = Query(None, pattern="^(Pendiente|En Proceso)$"),
+    limit: int = Query(100, ge=1, le=LIMITE_MAXIMO),
+    cursor: Optional[str] = None,
+):
+    consulta = ConsultaPaginada("""
         SELECT p.*, c.nombre as cliente_nombre, c.email as cliente_email
         FROM pedidos p
         LEFT JOIN clientes c ON p.cliente_id = c.id
-        WHERE p.id = ?
-    """, (pedido_id,))
-    pedido = cursor.fetchone()
-    
-    if not pedido:
-        conn.close()
-        raise HTTPException(status_code=404, detail="Pedido no encontrado")
-    
-    # Obtener detalles del pedido
-    cursor.execute("""
-        SELECT dp.*, pr.nombre as producto_nombre, pr.precio
-        FROM detalle_pedido dp
-        LEFT JOIN productos pr ON dp.producto_id = pr.id
-        WHERE dp.pedido_id = ?
-    """, (pedido_id,))
-    detalles = [dict(row) for row in cursor.fetchall()]
+    """, {"fecha": "p.fecha"}, "p.id")
+    consulta.filtrar("p." + estados.CONDICION_ABIERTOS)
+    if estado is not None:
+        consulta.filtrar("p.estado = ?", estado)
+    return await paginar(request, consulta, response, "fecha", "asc", limit, cursor)
+
+@app.get("/pedidos/export")
+def export_pedidos(
+    formato: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    cliente_id: Optional[int] = None,
+    desde: Optional[str] = None,
+    hasta: Optional[str] = None,
+    estado: Optional[str] = None,
+):
+    condiciones = []
+    parametros = []
+    if cliente_id is not None:
+        condiciones.append("p.cliente_id = ?")
+        parametros.append(cliente_id)
+    if desde is not None:
+        condiciones.append("p.fecha >= ?")
+        parametros.append(desde)
+    if hasta is not None:
+        if len(hasta) == 10:
+            hasta += " 23:59:59"
+        condiciones.append("p.fecha <= ?")
+        parametros.append(hasta)
+    if estado is not None:
+        condiciones.append("p.estado = ?")
+        parametros.append(estado)
     
-    conn.close()
+    # El cupo se libera cuando termina la respuesta, también si el cliente se desconecta
+    exportacion.reservar()
+    if formato == "csv":
+        contenido = exportacion.csv_plano(condiciones, parametros)
+        media_type = "text/csv; charset=utf-8"
+    else:
+        contenido = exportacion.ndjson(condiciones, parametros)
+        media_type = "application/x-ndjson"
+    return StreamingResponse(contenido, media_type=media_type, headers={
+        "Content-Disposition": f'attachment; filename="pedidos.{formato}"',
+    }, background=BackgroundTask(exportacion.liberar))
+
+@app.get("/pedidos/{pedido_id}")
+async def get_pedido(pedido_id: int, request: Request):
+    def consultar(conn):
+        cursor = conn.cursor()
+        
+        # Obtener información del pedido
+        cursor.execute("""
+            SELECT p.*, c.nombre as cliente_nombre, c.email as cliente_email
+            FROM pedidos p
+            LEFT JOIN clientes c ON p.cliente_id = c.id
+            WHERE p.id = ?
+        """, (pedido_id,))
+        pedido = cursor.fetchone()
+        
+        if not pedido:
+            raise HTTPException(status_code=404, detail="Pedido no encontrado")
+        
+        # Obtener detalles del pedido
+        cursor.execute("""
+            SELECT dp.*, pr.nombre as producto_nombre, pr.precio
+            FROM detalle_pedido dp
+            LEFT JOIN productos pr ON dp.producto_id = pr.id
+            WHERE dp.pedido_id = ?
+        """, (pedido_id,))
+        detalles = [dict(row) for row in cursor.fetchall()]
+        return pedido, detalles
+    pedido, detalles = await bd.leer(request, consultar)
     
     pedido_dict = dict(pedido)
     pedido_dict['detalles'] = detalles
     
     return pedido_dict
 
-@app.post("/pedidos")
-def create_pedido(pedido: PedidoCreate):
-    conn = get_db()
-    cursor = conn.cursor()
+# Agrupar líneas repetidas del mismo producto
+def agrupar_cantidades(items):
+    cantidades = {}
+    for item in items:
+        cantidades[item.producto_id] = cantidades.get(item.producto_id, 0) + item.cantidad
+    return cantidades
+
+# Registra un pedido dentro de una transacción ya abierta (BEGIN IMMEDIATE)
+def registrar_pedido(conn, pedido):
+    cantidades = agrupar_cantidades(pedido.productos)
     
-    try:
-        # Calcular total
-        total = 0
-        for item in pedido.productos:
-            cursor.execute("SELECT precio, stock FROM productos WHERE id = ?", 
-                         (item['producto_id'],))
-            producto = cursor.fetchone()
-            if not producto:
-                raise HTTPException(status_code=404, 
-                                  detail=f"Producto {item['producto_id']} no encontrado")
-            if producto['stock'] < item['cantidad']:
-                raise HTTPException(status_code=400, 
-                                  detail=f"Stock insuficiente para producto {item['producto_id']}")
-            total += producto['precio'] * item['cantidad']
-        
-        # Crear pedido
-        fecha_actual = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        cursor.execute("""
-            INSERT INTO pedidos (cliente_id, fecha, total, estado)
-            VALUES (?, ?, ?, 'Pendiente')
-        """, (pedido.cliente_id, fecha_actual, total))
-        pedido_id = cursor.lastrowid
-        
-        # Crear detalles y actualizar stock
-        for item in pedido.productos:
-            cursor.execute("SELECT precio FROM productos WHERE id = ?", 
-                         (item['producto_id'],))
-            precio = cursor.fetchone()['precio']
-            
-            cursor.execute("""
-                INSERT INTO detalle_pedido (pedido_id, producto_id, cantidad, precio_unitario)
-                VALUES (?, ?, ?, ?)
-            """, (pedido_id, item['producto_id'], item['cantidad'], precio))
-            
-            cursor.execute("""
-                UPDATE productos SET stock = stock - ? WHERE id = ?
-            """, (item['cantidad'], item['producto_id']))
-        
-        conn.commit()
-        conn.close()
-        return {"id": pedido_id, "total": total, "message": "Pedido creado exitosamente"}
+    if conn.execute("SELECT 1 FROM clientes WHERE id = ?", (pedido.cliente_id,)).fetchone() is None:
+        raise HTTPException(status_code=404, detail=f"Cliente {pedido.cliente_id} no encontrado")
     
-    except Exception as e:
-        conn.rollback()
-        conn.close()
-        raise HTTPException(status_code=400, detail=str(e))
-
-@app.delete("/pedidos/{pedido_id}")
-def delete_pedido(pedido_id: int):
-    conn = get_db()
-    cursor = conn.cursor()
+    # Con la versión de una cotización vigente, precios y stock salen del snapshot en memoria
+    productos = None
+    if pedido.version is not None and catalogo.version(conn) == pedido.version:
+        productos = snapshot_catalogo.productos_en(pedido.version, cantidades)
+    if productos is None:
+        # Traer todos los productos del carrito en una sola consulta
+        marcadores = ", ".join("?" * len(cantidades))
+        productos = {
+            row["id"]: row for row in conn.execute(
+                f"SELECT id, precio, stock FROM productos WHERE id IN ({marcadores})",
+                list(cantidades))
+        }
     
-    # Restaurar stock antes de eliminar
-    cursor.execute("""
-        SELECT producto_id, cantidad FROM detalle_pedido WHERE pedido_id = ?
-    """, (pedido_id,))
-    detalles = cursor.fetchall()
+    total = 0
+    for producto_id, cantidad in cantidades.items():
+        producto = productos.get(producto_id)
+        if producto is None:
+            raise HTTPException(status_code=404, 
+                              detail=f"Producto {producto_id} no encontrado")
+        if producto["stock"] < cantidad:
+            raise HTTPException(status_code=400, 
+                              detail=f"Stock insuficiente para producto {producto_id}")
+        total += producto["precio"] * cantidad
     
-    for detalle in detalles:
-        cursor.execute("""
-            UPDATE productos SET stock = stock + ? WHERE id = ?
-        """, (detalle['cantidad'], detalle['producto_id']))
+    fecha_actual = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    cursor = conn.execute("""
+        INSERT INTO pedidos (cliente_id, fecha, total, estado)
+        VALUES (?, ?, ?, 'Pendiente')
+    """, (pedido.cliente_id, fecha_actual, total))
+    pedido_id = cursor.lastrowid
+    
+    conn.executemany("""
+        INSERT INTO detalle_pedido (pedido_id, producto_id, cantidad, precio_unitario)
+        VALUES (?, ?, ?, ?)
+    """, [(pedido_id, producto_id, cantidad, productos[producto_id]["precio"])
+          for producto_id, cantidad in cantidades.items()])
     
-    cursor.execute("DELETE FROM detalle_pedido WHERE pedido_id = ?", (pedido_id,))
-    cursor.execute("DELETE FROM pedidos WHERE id = ?", (pedido_id,))
-    conn.commit()
-    conn.close()
-    return {"message": "Pedido eliminado exitosamente"}
+    # El descuento es condicional: si alguna línea no alcanza, se revierte todo el pedido
+    cursor = conn.executemany("""
+        UPDATE productos SET stock = stock - ? WHERE id = ? AND stock >= ?
+    """, [(cantidad, producto_id, cantidad) for producto_id, cantidad in cantidades.items()])
+    if cursor.rowcount != len(cantidades):
+        raise HTTPException(status_code=409, detail="Stock insuficiente, el pedido no se registró")
+    
+    return {"id": pedido_id, "total": total}
+
+# Valida un carrito completo contra el snapshot en memoria, sin consultar la base
+@app.post("/pedidos/quote")
+async def quote_pedido(cotizacion: CotizacionCreate):
+    return snapshot_catalogo.cotizar(agrupar_cantidades(cotizacion.productos))
+
+@app.post("/pedidos")
+async def create_pedido(pedido: PedidoCreate):
+    try:
+        resultado = await bd.ejecutar(escribir, lambda conn: registrar_pedido(conn, pedido))
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {**resultado, "message": "Pedido creado exitosamente"}
+
+# Baja lógica: el pedido queda como Cancelado (los reportes conservan el historial) y el stock
+# se devuelve en la misma transacción
+@app.delete("/pedidos/{pedido_id}")
+async def delete_pedido(pedido_id: int):
+    resultado = await bd.ejecutar(
+        escribir, lambda conn: estados.cambiar_estado(conn, pedido_id, estados.CANCELADO))
+    if resultado is None:
+        raise HTTPException(status_code=404, detail="Pedido no encontrado")
+    return {**resultado, "message": "Pedido cancelado exitosamente"}
+
+@app.post("/pedidos/cancelar")
+async def bulk_cancelar_pedidos(cancelacion: CancelacionBulk):
+    return await bd.ejecutar(
+        escribir, lambda conn: estados.cambiar_estados(conn, cancelacion.ids, estados.CANCELADO))
+
+# Mueve los pedidos cerrados más antiguos a las tablas de archivo, por lotes
+@app.post("/pedidos/archivar")
+def archivar_pedidos(
+    dias: int = Query(archivo.ANTIGUEDAD_DIAS, ge=0),
+    lote: int = Query(archivo.LOTE, ge=1, le=10000),
+):
+    with get_db() as conn:
+        return archivo.archivar(conn, dias, lote)
+
+# Sincronización incremental: los clientes piden solo lo que cambió desde su último seq
+def tablas_cambios(tablas):
+    if tablas is None:
+        return cambios.TABLAS
+    pedidas = tuple(dict.fromkeys(tabla.strip() for tabla in tablas.split(",") if tabla.strip()))
+    desconocidas = [tabla for tabla in pedidas if tabla not in cambios.TABLAS]
+    if desconocidas or not pedidas:
+        raise HTTPException(status_code=400, detail=f"Tablas inválidas: {', '.join(desconocidas) or tablas}")
+    return pedidas
+
+def leer_cambios(desde, limite, tablas):
+    with get_db() as conn:
+        return cambios.leer(conn, desde, limite, tablas)
+
+@app.get("/changes")
+async def get_changes(
+    request: Request,
+    since: Optional[int] = Query(None, ge=0),
+    limit: int = Query(cambios.LIMITE_POR_DEFECTO, ge=1, le=cambios.LIMITE_MAXIMO),
+    tablas: Optional[str] = None,
+):
+    # Sin since solo se informa el seq actual, para empezar a seguir el log tras una carga completa
+    if since is None:
+        _, ultimo = await bd.leer(request, cambios.estado)
+        return {"resync": False, "seq": ultimo, "cambios": [], "mas": False}
+    resultado = await bd.leer(request, cambios.leer, since, limit, tablas_cambios(tablas))
+    if resultado["resync"]:
+        return JSONResponse(status_code=410, content={
+            "detail": "El cursor es demasiado antiguo, se requiere una carga completa",
+            **resultado,
+        })
+    return resultado
+
+@app.get("/changes/stream")
+async def stream_changes(
+    request: Request,
+    since: Optional[int] = Query(None, ge=0),
+    tablas: Optional[str] = None,
+):
+    tablas = tablas_cambios(tablas)
+    # Al reconectar, EventSource envía el último id recibido
+    ultimo_id = request.headers.get("last-event-id")
+    if ultimo_id is not None and ultimo_id.isdigit():
+        since = int(ultimo_id)
+    if since is None:
+        since = await bd.ejecutar(vigia_cambios.ultimo)
+
+    async def eventos():
+        desde = since
+        ultimo_envio = time.monotonic()
+        yield f"retry: 3000\nid: {desde}\n\n"
+        while not await request.is_disconnected():
+            if await bd.ejecutar(vigia_cambios.ultimo) > desde:
+                resultado = await bd.ejecutar(leer_cambios, desde, cambios.LIMITE_MAXIMO, tablas)
+                if resultado["resync"]:
+                    yield f"event: resync\ndata: {json.dumps({'seq': resultado['seq']})}\n\n"
+                    return
+                for cambio in resultado["cambios"]:
+                    yield f"id: {cambio['seq']}\nevent: cambio\ndata: {json.dumps(cambio, ensure_ascii=False)}\n\n"
+                if resultado["cambios"]:
+                    ultimo_envio = time.monotonic()
+                desde = resultado["seq"]
+                if resultado["mas"]:
+                    continue
+            if time.monotonic() - ultimo_envio >= SSE_KEEPALIVE:
+                yield ": keep-alive\n\n"
+                ultimo_envio = time.monotonic()
+            await asyncio.sleep(SSE_INTERVALO)
+
+    return StreamingResponse(eventos(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+@app.post("/changes/compact")
+def compact_changes(retener: int = Query(cambios.RETENCION, ge=0)):
+    with transaccion() as conn:
+        return cambios.compactar(conn, retener)
+
+@app.patch("/pedidos/estado")
+async def bulk_estado_pedidos(cambio: EstadosBulk):
+    return await bd.ejecutar(escribir, lambda conn: estados.cambiar_estados(conn, cambio.ids, cambio.estado))
+
+@app.patch("/pedidos/{pedido_id}/estado")
+async def update_estado_pedido(pedido_id: int, cambio: EstadoUpdate):
+    resultado = await bd.ejecutar(escribir, lambda conn: estados.cambiar_estado(conn, pedido_id, cambio.estado))
+    if resultado is None:
+        raise HTTPException(status_code=404, detail="Pedido no encontrado")
+    return resultado
+
+# Estadísticas del dashboard, leídas de los resúmenes mantenidos por triggers
+@app.get("/stats")
+async def get_stats(
+    request: Request,
+    umbral_stock: int = Query(20, ge=0),
+    limite: int = Query(5, ge=1, le=100),
+):
+    def consultar(conn):
+        resumen = conn.execute("SELECT pedidos, ingresos FROM resumen_pedidos WHERE id = 1").fetchone()
+        por_estado = {
+            row["estado"]: {"pedidos": row["pedidos"], "ingresos": row["ingresos"]}
+            for row in conn.execute("SELECT * FROM resumen_estados WHERE pedidos > 0")
+        }
+        stock_bajo = [dict(row) for row in conn.execute("""
+            SELECT id, nombre, stock FROM productos
+            WHERE stock < ? ORDER BY stock LIMIT ?
+        """, (umbral_stock, limite))]
+        mas_vendidos = [dict(row) for row in conn.execute("""
+            SELECT v.producto_id, p.nombre, v.unidades, v.ingresos
+            FROM ventas_producto v
+            LEFT JOIN productos p ON p.id = v.producto_id
+            WHERE v.unidades > 0
+            ORDER BY v.unidades DESC LIMIT ?
+        """, (limite,))]
+        # Totales del catálogo y de clientes: el dashboard ya no descarga los listados completos
+        productos, = conn.execute("SELECT COUNT(*) FROM productos").fetchone()
+        clientes, = conn.execute("SELECT COUNT(*) FROM clientes").fetchone()
+        return resumen, por_estado, stock_bajo, mas_vendidos, productos, clientes
+    resumen, por_estado, stock_bajo, mas_vendidos, productos, clientes = await bd.leer(request, consultar)
+    return {
+        "pedidos": resumen["pedidos"],
+        "ingresos": resumen["ingresos"],
+        "productos": productos,
+        "clientes": clientes,
+        "por_estado": por_estado,
+        "stock_bajo": stock_bajo,
+        "mas_vendidos": mas_vendidos,
+    }
+
+# Analítica de ventas (formato columnar)
+@app.get("/analytics/ventas")
+async def get_analytics_ventas(
+    request: Request,
+    agrupar: str = Query("dia", pattern="^(dia|semana|producto|categoria)$"),
+    desde: Optional[str] = None,
+    hasta: Optional[str] = None,
+    fuente: str = Query("rollup", pattern="^(rollup|raw)$"),
+):
+    resultado = await bd.leer(request, analitica.ventas, agrupar, desde, hasta, fuente)
+    return {"agrupar": agrupar, "fuente": fuente, **resultado}
+
+@app.get("/analytics/top-productos")
+async def get_analytics_top_productos(
+    request: Request,
+    n: int = Query(10, ge=1, le=LIMITE_MAXIMO),
+    desde: Optional[str] = None,
+    hasta: Optional[str] = None,
+    por: str = Query("unidades", pattern="^(unidades|ingresos)$"),
+    fuente: str = Query("rollup", pattern="^(rollup|raw)$"),
+):
+    resultado = await bd.leer(request, analitica.top_productos, n, desde, hasta, fuente, por)
+    return {"fuente": fuente, **resultado}
+
+# Imágenes de productos: originales y variantes redimensionadas (generadas la primera vez que se piden)
+@app.get("/static/images/{nombre}")
+def get_imagen(nombre: str, request: Request):
+    return almacen_imagenes.respuesta(request, nombre)
+
+@app.get("/static/images/{variante}/{nombre}")
+def get_imagen_variante(variante: str, nombre: str, request: Request):
+    if variante not in imagenes.VARIANTES:
+        raise HTTPException(status_code=404, detail="Variante desconocida")
+    return almacen_imagenes.respuesta(request, nombre, variante)
+
+def pregenerar_variantes():
+    with get_db() as conn:
+        nombres = imagenes.nombres_catalogo(conn)
+    return almacen_imagenes.pregenerar(nombres)
+
+@app.post("/imagenes/variantes", status_code=202)
+def post_pregenerar_variantes():
+    iniciada = pregenerar_variantes()
+    return {"iniciada": iniciada, **almacen_imagenes.estadisticas()}
+
+@app.get("/imagenes/variantes")
+async def get_variantes_stats():
+    return almacen_imagenes.estadisticas()
+
+# Métricas en formato Prometheus
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(metricas.exportar(pool, catalogo),
+                             media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# Readiness: 503 mientras se aplican migraciones o se calienta la app, 200 después
+@app.get("/ready")
+async def get_ready():
+    return JSONResponse(status_code=200 if arranque.listo else 503, content=arranque.estado())
+
+# Estado del pool de conexiones y del executor de las rutas async
+@app.get("/db/pool")
+async def get_pool_stats():
+    return {**pool.estadisticas(), "ejecutor": bd.estadisticas()}
+
+@app.get("/escritor")
+async def get_escritor_stats():
+    if escritor is None:
+        return {"modo": ESCRITOR_PEDIDOS}
+    return {"modo": ESCRITOR_PEDIDOS, **escritor.estadisticas()}
+
+@app.get("/cotizaciones/snapshot")
+async def get_snapshot_stats():
+    return snapshot_catalogo.estadisticas()
+
+@app.get("/cache/catalogo")
+async def get_cache_stats():
+    return catalogo.estadisticas()
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
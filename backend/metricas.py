@@ -0,0 +1,265 @@
+import bisect
+import contextvars
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+HABILITADAS = os.environ.get("FITNESS_METRICS", "1") != "0"
+# Consultas más lentas que este umbral se registran con su EXPLAIN QUERY PLAN (0 = desactivado)
+UMBRAL_LENTAS_MS = float(os.environ.get("FITNESS_SLOW_QUERY_MS", "0"))
+
+BUCKETS_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CONSULTAS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+BUCKETS_BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+logger = logging.getLogger("fitness.sql")
+
+
+class Histograma:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.series = {}
+
+    def observar(self, etiquetas, valor):
+        serie = self.series.get(etiquetas)
+        if serie is None:
+            # [conteos por bucket..., +Inf], suma
+            serie = self.series[etiquetas] = [[0] * (len(self.buckets) + 1), 0.0]
+        serie[0][bisect.bisect_left(self.buckets, valor)] += 1
+        serie[1] += valor
+
+
+class Registro:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.peticiones = {}
+        self.latencia = Histograma(BUCKETS_LATENCIA)
+        self.bytes_respuesta = Histograma(BUCKETS_BYTES)
+        self.consultas_por_peticion = Histograma(BUCKETS_CONSULTAS)
+        self.tiempo_sql_por_peticion = Histograma(BUCKETS_LATENCIA)
+        self.filas = {}
+        self.sentencias = Histograma(BUCKETS_LATENCIA)
+
+    def registrar_peticion(self, ruta, metodo, estado, duracion, tamano, sql):
+        with self._lock:
+            clave = (ruta, metodo, estado)
+            self.peticiones[clave] = self.peticiones.get(clave, 0) + 1
+            self.latencia.observar((ruta, metodo), duracion)
+            self.bytes_respuesta.observar((ruta,), tamano)
+            self.consultas_por_peticion.observar((ruta,), sql.consultas)
+            self.tiempo_sql_por_peticion.observar((ruta,), sql.tiempo)
+            self.filas[(ruta,)] = self.filas.get((ruta,), 0) + sql.filas
+
+    def registrar_sentencia(self, tipo, duracion):
+        with self._lock:
+            self.sentencias.observar((tipo,), duracion)
+
+
+registro = Registro()
+
+
+class EstadisticasPeticion:
+    __slots__ = ("consultas", "tiempo", "filas")
+
+    def __init__(self):
+        self.consultas = 0
+        self.tiempo = 0.0
+        self.filas = 0
+
+
+_peticion_actual = contextvars.ContextVar("peticion_actual", default=None)
+
+
+CON_PLAN = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+
+def _registrar_sql(conn, sql, parametros, duracion):
+    actual = _peticion_actual.get()
+    if actual is not None:
+        actual.consultas += 1
+        actual.tiempo += duracion
+    # Por la primera palabra: "WITH" tiene cuatro letras y un prefijo fijo no lo reconoce
+    palabras = sql.split(None, 1)
+    tipo = palabras[0].upper() if palabras else ""
+    registro.registrar_sentencia(tipo if tipo in CON_PLAN else "OTRA", duracion)
+    if UMBRAL_LENTAS_MS and tipo in CON_PLAN and duracion * 1000 >= UMBRAL_LENTAS_MS:
+        _registrar_lenta(conn, sql, parametros, duracion)
+
+
+def _registrar_lenta(conn, sql, parametros, duracion):
+    plan = ""
+    try:
+        filas = sqlite3.Connection.execute(conn, "EXPLAIN QUERY PLAN " + sql, parametros).fetchall()
+        plan = "; ".join(str(fila[3]) for fila in filas)
+    except sqlite3.Error:
+        pass
+    logger.warning("Consulta lenta (%.1f ms): %s | plan: %s", duracion * 1000, " ".join(sql.split()), plan)
+
+
+# Cursor y conexión instrumentados: miden cada sentencia y cuentan filas leídas
+class CursorInstrumentado(sqlite3.Cursor):
+    def execute(self, sql, parametros=()):
+        inicio = time.perf_counter()
+        try:
+            return super().execute(sql, parametros)
+        finally:
+            _registrar_sql(self.connection, sql, parametros, time.perf_counter() - inicio)
+
+    def executemany(self, sql, secuencia):
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(sql, secuencia)
+        finally:
+            _registrar_sql(self.connection, sql, (), time.perf_counter() - inicio)
+
+    def fetchone(self):
+        fila = super().fetchone()
+        if fila is not None:
+            actual = _peticion_actual.get()
+            if actual is not None:
+                actual.filas += 1
+        return fila
+
+    def fetchmany(self, *args, **kwargs):
+        filas = super().fetchmany(*args, **kwargs)
+        actual = _peticion_actual.get()
+        if actual is not None:
+            actual.filas += len(filas)
+        return filas
+
+    def fetchall(self):
+        filas = super().fetchall()
+        actual = _peticion_actual.get()
+        if actual is not None:
+            actual.filas += len(filas)
+        return filas
+
+
+class ConexionInstrumentada(sqlite3.Connection):
+    def cursor(self, factory=CursorInstrumentado):
+        return super().cursor(factory)
+
+    def execute(self, sql, parametros=()):
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, secuencia):
+        return self.cursor().executemany(sql, secuencia)
+
+
+class MiddlewareMetricas:
+    def __init__(self, app):
+        self.app = app
+        self._rutas = None
+
+    def _ruta(self, scope):
+        # Se etiqueta por plantilla de ruta (/productos/{producto_id}), no por URL concreta
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "-"
+        if self._rutas is None or endpoint not in self._rutas:
+            self._rutas = {
+                getattr(ruta, "endpoint", None): ruta.path
+                for ruta in scope["app"].routes
+            }
+        return self._rutas.get(endpoint, "-")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        sql = EstadisticasPeticion()
+        token = _peticion_actual.set(sql)
+        estado = 500
+        tamano = 0
+        inicio = time.perf_counter()
+
+        async def enviar(mensaje):
+            nonlocal estado, tamano
+            if mensaje["type"] == "http.response.start":
+                estado = mensaje["status"]
+            elif mensaje["type"] == "http.response.body":
+                tamano += len(mensaje.get("body", b""))
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            _peticion_actual.reset(token)
+            registro.registrar_peticion(
+                self._ruta(scope), scope["method"], estado,
+                time.perf_counter() - inicio, tamano, sql)
+
+
+def _etiquetas(nombres, valores, extra=""):
+    pares = [f'{nombre}="{_escapar(valor)}"' for nombre, valor in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _histograma(lineas, nombre, ayuda, histograma, etiquetas):
+    lineas.append(f"# HELP {nombre} {ayuda}")
+    lineas.append(f"# TYPE {nombre} histogram")
+    for valores, (conteos, suma) in sorted(histograma.series.items()):
+        acumulado = 0
+        for limite, conteo in zip(histograma.buckets, conteos):
+            acumulado += conteo
+            le = 'le="%s"' % limite
+            lineas.append(f"{nombre}_bucket{_etiquetas(etiquetas, valores, le)} {acumulado}")
+        acumulado += conteos[-1]
+        le = 'le="+Inf"'
+        lineas.append(f"{nombre}_bucket{_etiquetas(etiquetas, valores, le)} {acumulado}")
+        lineas.append(f"{nombre}_sum{_etiquetas(etiquetas, valores)} {suma}")
+        lineas.append(f"{nombre}_count{_etiquetas(etiquetas, valores)} {acumulado}")
+
+
+def _simple(lineas, nombre, tipo, ayuda, valor):
+    lineas.append(f"# HELP {nombre} {ayuda}")
+    lineas.append(f"# TYPE {nombre} {tipo}")
+    lineas.append(f"{nombre} {valor}")
+
+
+def exportar(pool=None, cache=None):
+    # Formato de exposición de texto de Prometheus
+    lineas = []
+    with registro._lock:
+        lineas.append("# HELP http_requests_total Peticiones HTTP atendidas")
+        lineas.append("# TYPE http_requests_total counter")
+        for (ruta, metodo, estado), valor in sorted(registro.peticiones.items()):
+            lineas.append(f"http_requests_total{_etiquetas(('ruta', 'metodo', 'estado'), (ruta, metodo, estado))} {valor}")
+        _histograma(lineas, "http_request_duration_seconds", "Latencia por ruta",
+                    registro.latencia, ("ruta", "metodo"))
+        _histograma(lineas, "http_response_size_bytes", "Tamaño de la respuesta",
+                    registro.bytes_respuesta, ("ruta",))
+        _histograma(lineas, "sql_statements_per_request", "Sentencias SQL por petición",
+                    registro.consultas_por_peticion, ("ruta",))
+        _histograma(lineas, "sql_time_per_request_seconds", "Tiempo total en SQL por petición",
+                    registro.tiempo_sql_por_peticion, ("ruta",))
+        _histograma(lineas, "sql_statement_duration_seconds", "Duración de cada sentencia SQL",
+                    registro.sentencias, ("tipo",))
+        lineas.append("# HELP sql_rows_returned_total Filas leídas por las consultas")
+        lineas.append("# TYPE sql_rows_returned_total counter")
+        for (ruta,), valor in sorted(registro.filas.items()):
+            lineas.append(f"sql_rows_returned_total{_etiquetas(('ruta',), (ruta,))} {valor}")
+
+    if pool is not None:
+        datos = pool.estadisticas()
+        _simple(lineas, "db_pool_connections", "gauge", "Conexiones abiertas en el pool", datos["creadas"])
+        _simple(lineas, "db_pool_in_use", "gauge", "Conexiones en uso", datos["en_uso"])
+        _simple(lineas, "db_pool_checkouts_total", "counter", "Conexiones entregadas", datos["checkouts"])
+        _simple(lineas, "db_pool_waits_total", "counter", "Esperas por una conexión libre", datos["esperas"])
+        _simple(lineas, "db_pool_timeouts_total", "counter", "Esperas agotadas", datos["timeouts"])
+        _simple(lineas, "db_pool_wait_seconds_total", "counter", "Tiempo total esperando conexiones",
+                datos["tiempo_espera_ms"] / 1000)
+    if cache is not None:
+        datos = cache.estadisticas()
+        _simple(lineas, "catalog_cache_hits_total", "counter", "Aciertos de la caché del catálogo", datos["aciertos"])
+        _simple(lineas, "catalog_cache_misses_total", "counter", "Fallos de la caché del catálogo", datos["fallos"])
+    return "\n".join(lineas) + "\n"
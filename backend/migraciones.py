@@ -0,0 +1,83 @@
+import os
+import sqlite3
+import time
+
+import init_db
+
+# Cuánto espera un proceso a que otro termine de migrar (varios workers arrancando a la vez)
+ESPERA_LOCK = float(os.environ.get("FITNESS_MIGRATIONS_TIMEOUT", "300"))
+
+
+def _sentencias(*sentencias):
+    def aplicar(cursor):
+        for sentencia in sentencias:
+            cursor.execute(sentencia)
+    return aplicar
+
+
+# (versión, descripción, función sobre un cursor). La versión aplicada se guarda en
+# PRAGMA user_version. Las migraciones ya publicadas no se modifican: un cambio de esquema
+# nuevo se agrega al final con la versión siguiente y sus propias sentencias, sin tocar las
+# listas de init_db que leen las migraciones 1 y 2.
+MIGRACIONES = [
+    (1, "tablas principales", init_db.crear_tablas),
+    (2, "índices, archivo, búsqueda, resúmenes y registro de cambios", init_db.crear_esquema_derivado),
+    (3, "pedidos archivados como 'archive' en el registro de cambios", _sentencias(
+        "DROP TRIGGER IF EXISTS pedidos_cambios_delete",
+        """
+        CREATE TRIGGER pedidos_cambios_delete AFTER DELETE ON pedidos BEGIN
+            INSERT INTO cambios (tabla, fila_id, operacion)
+            VALUES ('pedidos', old.id, IIF(NOT EXISTS (SELECT 1 FROM pedidos_archivo WHERE id = old.id),
+                                           'delete', 'archive'));
+        END
+        """,
+    )),
+    (4, "índice de emails sin distinguir mayúsculas", _sentencias(
+        "CREATE INDEX IF NOT EXISTS idx_clientes_email_lower ON clientes(lower(email))",
+    )),
+]
+
+
+def version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def pendientes(conn):
+    actual = version(conn)
+    return [(numero, descripcion) for numero, descripcion, _ in MIGRACIONES if numero > actual]
+
+
+# Aplica las migraciones pendientes, cada una en su propia transacción junto con el cambio de
+# user_version: si una falla, la base queda en la versión anterior. BEGIN IMMEDIATE serializa
+# a los procesos que migran a la vez; el que llega segundo encuentra la versión ya aplicada.
+def migrar(conn):
+    if conn.in_transaction:
+        conn.commit()
+    aplicadas = []
+    for numero, descripcion, aplicar in MIGRACIONES:
+        inicio = time.perf_counter()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if version(conn) >= numero:
+                conn.rollback()
+                continue
+            aplicar(conn.cursor())
+            conn.execute(f"PRAGMA user_version = {numero}")
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+        aplicadas.append({
+            "version": numero,
+            "descripcion": descripcion,
+            "ms": round((time.perf_counter() - inicio) * 1000, 1),
+        })
+    return aplicadas
+
+
+def migrar_base(ruta):
+    conn = sqlite3.connect(ruta, timeout=ESPERA_LOCK)
+    try:
+        return migrar(conn)
+    finally:
+        conn.close()
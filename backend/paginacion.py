@@ -0,0 +1,126 @@
+import base64
+import json
+
+LIMITE_POR_DEFECTO = 100
+LIMITE_MAXIMO = 500
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+def codificar_cursor(orden, descendente, valores):
+    datos = json.dumps([orden, int(descendente), list(valores)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(datos.encode()).decode().rstrip("=")
+
+
+def _valor_valido(valor):
+    # Lo que SQLite puede comparar como clave de orden; los enteros dentro de su rango de 64 bits
+    if isinstance(valor, bool):
+        return False
+    if isinstance(valor, int):
+        return -2**63 <= valor < 2**63
+    return valor is None or isinstance(valor, (float, str))
+
+
+def decodificar_cursor(cursor, orden, descendente, cantidad):
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        datos = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        orden_cursor, desc_cursor, valores = datos
+    except (ValueError, TypeError):
+        raise CursorInvalido("Cursor inválido")
+    # Un cursor solo es válido para el mismo orden con el que se generó
+    if orden_cursor != orden or bool(desc_cursor) != descendente:
+        raise CursorInvalido("El cursor no corresponde al orden solicitado")
+    # Un valor por clave de orden (columna e id, o solo id)
+    if not isinstance(valores, list) or len(valores) != cantidad or not all(map(_valor_valido, valores)):
+        raise CursorInvalido("Cursor inválido")
+    return valores
+
+
+# Arma un SELECT con filtros y paginación por keyset (orden estable por columna + id)
+class ConsultaPaginada:
+    def __init__(self, select, columnas_orden, columna_id):
+        self.select = select
+        self.columnas_orden = columnas_orden
+        self.columna_id = columna_id
+        self.condiciones = []
+        self.parametros = []
+
+    def filtrar(self, condicion, *valores):
+        self.condiciones.append(condicion)
+        self.parametros.extend(valores)
+        return self
+
+    def _sql(self, orden, descendente, limite, cursor):
+        columna = self.columnas_orden[orden]
+        condiciones = list(self.condiciones)
+        parametros = list(self.parametros)
+        comparador = "<" if descendente else ">"
+
+        if cursor is not None:
+            valores = decodificar_cursor(cursor, orden, descendente, len(self._claves(orden)))
+            if columna == self.columna_id:
+                condiciones.append(f"{self.columna_id} {comparador} ?")
+                parametros.append(valores[-1])
+            else:
+                condiciones.append(f"({columna}, {self.columna_id}) {comparador} (?, ?)")
+                parametros.extend(valores)
+
+        direccion = "DESC" if descendente else "ASC"
+        sql = self.select
+        if condiciones:
+            sql += " WHERE " + " AND ".join(condiciones)
+        if columna == self.columna_id:
+            sql += f" ORDER BY {self.columna_id} {direccion}"
+        else:
+            sql += f" ORDER BY {columna} {direccion}, {self.columna_id} {direccion}"
+        if limite is not None:
+            # Se pide una fila extra para saber si existe una página siguiente
+            sql += " LIMIT ?"
+            parametros.append(limite + 1)
+        return sql, parametros
+
+    def _claves(self, orden):
+        columna = self.columnas_orden[orden]
+        clave_id = self.columna_id.split(".")[-1]
+        if columna == self.columna_id:
+            return [clave_id]
+        return [columna.split(".")[-1], clave_id]
+
+    def ejecutar(self, conn, orden, descendente, limite=None, cursor=None):
+        sql, parametros = self._sql(orden, descendente, limite, cursor)
+        filas = conn.execute(sql, parametros).fetchall()
+
+        siguiente = None
+        if limite is not None and len(filas) > limite:
+            filas = filas[:limite]
+            ultima = filas[-1]
+            valores = [ultima[clave] for clave in self._claves(orden)]
+            siguiente = codificar_cursor(orden, descendente, valores)
+        return filas, siguiente
+
+    # Igual que ejecutar, pero SQLite arma cada fila como texto JSON (json_object) con solo
+    # los `campos` pedidos; devuelve el arreglo ya codificado en bytes, sin pasar por dicts.
+    # Los campos deben venir validados: se interpolan como nombres de columna.
+    def ejecutar_json(self, conn, orden, descendente, limite=None, cursor=None, campos=()):
+        interno, parametros = self._sql(orden, descendente, limite, cursor)
+        claves = self._claves(orden)
+        direccion = "DESC" if descendente else "ASC"
+        objeto = ", ".join(f"'{campo}', t.{campo}" for campo in campos)
+        sql = f"""
+            SELECT json_object({objeto}), {", ".join(f"t.{clave}" for clave in claves)}
+            FROM ({interno}) t
+            ORDER BY {", ".join(f"t.{clave} {direccion}" for clave in claves)}
+        """
+        cursor_sql = conn.cursor()
+        cursor_sql.row_factory = None
+        filas = cursor_sql.execute(sql, parametros).fetchall()
+
+        siguiente = None
+        if limite is not None and len(filas) > limite:
+            filas = filas[:limite]
+            siguiente = codificar_cursor(orden, descendente, list(filas[-1][1:]))
+        cuerpo = "[" + ",".join([fila[0] for fila in filas]) + "]"
+        return cuerpo.encode(), siguiente
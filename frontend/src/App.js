@@ -2,31 +2,71 @@ import React, { useState, useEffect } from 'react';
 import { ShoppingCart, Package, Users, TrendingUp, Plus, Edit2, Trash2, X, BarChart3, DollarSign } from 'lucide-react';
 
 const API_URL = 'http://localhost:8000';
+// Filas por página de los listados; las siguientes se piden con "Cargar más"
+const TAMANO_PAGINA = 24;
+const PREFIJO_IMAGENES = '/static/images/';
+
+// Las imágenes del catálogo las sirve la API; las grillas piden una variante reducida
+// ("thumb" 160 px o "card" 400 px, en WebP). Las URL externas se usan tal cual.
+const urlImagen = (imagenUrl, variante) => {
+  if (!imagenUrl) return 'https://via.placeholder.com/300x200?text=Sin+Imagen';
+  if (!imagenUrl.startsWith(PREFIJO_IMAGENES)) return imagenUrl;
+  return `${API_URL}${PREFIJO_IMAGENES}${variante}/${imagenUrl.slice(PREFIJO_IMAGENES.length)}`;
+};
 
 export default function FitnessStore() {
   const [activeView, setActiveView] = useState('productos');
   const [productos, setProductos] = useState([]);
+  const [productosCursor, setProductosCursor] = useState(null);
+  const [filtroCategoria, setFiltroCategoria] = useState('todas');
+  const [busqueda, setBusqueda] = useState('');
   const [categorias, setCategorias] = useState([]);
   const [clientes, setClientes] = useState([]);
+  const [clientesCursor, setClientesCursor] = useState(null);
   const [pedidos, setPedidos] = useState([]);
+  const [pedidosCursor, setPedidosCursor] = useState(null);
+  const [stats, setStats] = useState({ pedidos: 0, ingresos: 0, productos: 0, clientes: 0, stock_bajo: [] });
   const [carrito, setCarrito] = useState([]);
   const [showModal, setShowModal] = useState(false);
   const [modalType, setModalType] = useState('');
   const [editingItem, setEditingItem] = useState(null);
 
+  // Una página de un listado: sin cursor reemplaza la lista, con cursor agrega la página
+  // siguiente. X-Next-Cursor indica si quedan más.
+  const fetchPagina = async (ruta, params, cursor, setItems, setCursor) => {
+    const query = new URLSearchParams({ limit: TAMANO_PAGINA, ...params });
+    if (cursor) query.set('cursor', cursor);
+    const res = await fetch(`${API_URL}${ruta}?${query}`);
+    const items = await res.json();
+    setItems(anteriores => cursor ? [...anteriores, ...items] : items);
+    setCursor(res.headers.get('X-Next-Cursor'));
+  };
+
   // Cargar datos iniciales
   useEffect(() => {
-    fetchProductos();
     fetchCategorias();
     fetchClientes();
     fetchPedidos();
+    fetchStats();
   }, []);
 
-  const fetchProductos = async () => {
+  // El filtro por categoría y la búsqueda se resuelven en el servidor
+  useEffect(() => {
+    // Espera a que se termine de escribir antes de buscar
+    const espera = setTimeout(() => fetchProductos(), busqueda ? 300 : 0);
+    return () => clearTimeout(espera);
+  }, [filtroCategoria, busqueda]);
+
+  const fetchProductos = async (cursor = null) => {
     try {
-      const res = await fetch(`${API_URL}/productos`);
-      const data = await res.json();
-      setProductos(data);
+      const params = filtroCategoria === 'todas' ? {} : { categoria_id: filtroCategoria };
+      const texto = busqueda.trim();
+      if (texto) {
+        // Búsqueda de texto completo: devuelve los resultados más relevantes, sin más páginas
+        await fetchPagina('/productos/search', { ...params, q: texto }, null, setProductos, setProductosCursor);
+      } else {
+        await fetchPagina('/productos', params, cursor, setProductos, setProductosCursor);
+      }
     } catch (error) {
       console.error('Error al cargar productos:', error);
     }
@@ -42,26 +82,33 @@ export default function FitnessStore() {
     }
   };
 
-  const fetchClientes = async () => {
+  const fetchClientes = async (cursor = null) => {
     try {
-      const res = await fetch(`${API_URL}/clientes`);
-      const data = await res.json();
-      setClientes(data);
+      await fetchPagina('/clientes', {}, cursor, setClientes, setClientesCursor);
     } catch (error) {
       console.error('Error al cargar clientes:', error);
     }
   };
 
-  const fetchPedidos = async () => {
+  const fetchPedidos = async (cursor = null) => {
     try {
-      const res = await fetch(`${API_URL}/pedidos`);
-      const data = await res.json();
-      setPedidos(data);
+      await fetchPagina('/pedidos', {}, cursor, setPedidos, setPedidosCursor);
     } catch (error) {
       console.error('Error al cargar pedidos:', error);
     }
   };
 
+  // Totales del dashboard: /stats ya excluye los pedidos cancelados y cuenta productos y clientes
+  const fetchStats = async () => {
+    try {
+      const res = await fetch(`${API_URL}/stats`);
+      const data = await res.json();
+      setStats(data);
+    } catch (error) {
+      console.error('Error al cargar estadísticas:', error);
+    }
+  };
+
   // CRUD Productos
   const handleSaveProducto = async (formData) => {
     try {
@@ -79,6 +126,7 @@ export default function FitnessStore() {
       
       if (res.ok) {
         fetchProductos();
+        fetchStats();
         setShowModal(false);
         setEditingItem(null);
       }
@@ -92,6 +140,7 @@ export default function FitnessStore() {
       try {
         await fetch(`${API_URL}/productos/${id}`, { method: 'DELETE' });
         fetchProductos();
+        fetchStats();
       } catch (error) {
         console.error('Error al eliminar producto:', error);
       }
@@ -115,6 +164,7 @@ export default function FitnessStore() {
       
       if (res.ok) {
         fetchClientes();
+        fetchStats();
         setShowModal(false);
         setEditingItem(null);
       }
@@ -128,6 +178,7 @@ export default function FitnessStore() {
       try {
         await fetch(`${API_URL}/clientes/${id}`, { method: 'DELETE' });
         fetchClientes();
+        fetchStats();
       } catch (error) {
         console.error('Error al eliminar cliente:', error);
       }
@@ -188,6 +239,7 @@ export default function FitnessStore() {
         setCarrito([]);
         fetchPedidos();
         fetchProductos();
+        fetchStats();
         setShowModal(false);
       }
     } catch (error) {
@@ -196,13 +248,18 @@ export default function FitnessStore() {
   };
 
   const handleDeletePedido = async (id) => {
-    if (window.confirm('¿Eliminar este pedido?')) {
+    if (window.confirm('¿Cancelar este pedido? El stock se devuelve al catálogo.')) {
       try {
-        await fetch(`${API_URL}/pedidos/${id}`, { method: 'DELETE' });
+        const response = await fetch(`${API_URL}/pedidos/${id}`, { method: 'DELETE' });
+        if (!response.ok) {
+          const error = await response.json();
+          alert(error.detail);
+        }
         fetchPedidos();
         fetchProductos();
+        fetchStats();
       } catch (error) {
-        console.error('Error al eliminar pedido:', error);
+        console.error('Error al cancelar pedido:', error);
       }
     }
   };
@@ -347,7 +404,7 @@ export default function FitnessStore() {
             <div>
               <p style={{ color: '#6b7280', fontSize: '0.875rem', marginBottom: '0.5rem' }}>Total Ventas</p>
               <p style={{ fontSize: '1.875rem', fontWeight: 'bold', color: '#10b981' }}>
-                ${pedidos.reduce((sum, p) => sum + p.total, 0).toFixed(2)}
+                ${stats.ingresos.toFixed(2)}
               </p>
             </div>
             <DollarSign size={40} style={{ color: '#10b981' }} />
@@ -365,7 +422,7 @@ export default function FitnessStore() {
             <div>
               <p style={{ color: '#6b7280', fontSize: '0.875rem', marginBottom: '0.5rem' }}>Total Pedidos</p>
               <p style={{ fontSize: '1.875rem', fontWeight: 'bold', color: '#3b82f6' }}>
-                {pedidos.length}
+                {stats.pedidos}
               </p>
             </div>
             <ShoppingCart size={40} style={{ color: '#3b82f6' }} />
@@ -383,7 +440,7 @@ export default function FitnessStore() {
             <div>
               <p style={{ color: '#6b7280', fontSize: '0.875rem', marginBottom: '0.5rem' }}>Total Productos</p>
               <p style={{ fontSize: '1.875rem', fontWeight: 'bold', color: '#8b5cf6' }}>
-                {productos.length}
+                {stats.productos}
               </p>
             </div>
             <Package size={40} style={{ color: '#8b5cf6' }} />
@@ -401,7 +458,7 @@ export default function FitnessStore() {
             <div>
               <p style={{ color: '#6b7280', fontSize: '0.875rem', marginBottom: '0.5rem' }}>Total Clientes</p>
               <p style={{ fontSize: '1.875rem', fontWeight: 'bold', color: '#f97316' }}>
-                {clientes.length}
+                {stats.clientes}
               </p>
             </div>
             <Users size={40} style={{ color: '#f97316' }} />
@@ -468,8 +525,9 @@ export default function FitnessStore() {
             ⚠️ Alertas de Stock Bajo
           </h3>
           <div style={{ display: 'flex', flexDirection: 'column', gap: '0.75rem' }}>
-            {productos.filter(p => p.stock < 20).slice(0, 5).length > 0 ? (
-              productos.filter(p => p.stock < 20).slice(0, 5).map(producto => (
+            {/* /stats devuelve los 5 productos con menos stock por debajo de 20 */}
+            {stats.stock_bajo.length > 0 ? (
+              stats.stock_bajo.map(producto => (
                 <div key={producto.id} style={{ 
                   display: 'flex', 
                   justifyContent: 'space-between', 
@@ -545,6 +603,11 @@ export default function FitnessStore() {
           <ProductosView
             productos={productos}
             categorias={categorias}
+            filtroCategoria={filtroCategoria}
+            onFiltrarCategoria={setFiltroCategoria}
+            busqueda={busqueda}
+            onBuscar={setBusqueda}
+            onCargarMas={productosCursor ? () => fetchProductos(productosCursor) : null}
             onAdd={() => {
               setEditingItem(null);
               setModalType('producto');
@@ -563,6 +626,7 @@ export default function FitnessStore() {
         {activeView === 'clientes' && (
           <ClientesView
             clientes={clientes}
+            onCargarMas={clientesCursor ? () => fetchClientes(clientesCursor) : null}
             onAdd={() => {
               setEditingItem(null);
               setModalType('cliente');
@@ -580,6 +644,7 @@ export default function FitnessStore() {
         {activeView === 'pedidos' && (
           <PedidosView
             pedidos={pedidos}
+            onCargarMas={pedidosCursor ? () => fetchPedidos(pedidosCursor) : null}
             carrito={carrito}
             clientes={clientes}
             onActualizarCantidad={actualizarCantidad}
@@ -649,14 +714,7 @@ export default function FitnessStore() {
 }
 
 // Componente Vista de Productos
-function ProductosView({ productos, categorias, onAdd, onEdit, onDelete, onAddToCart }) {
-  const [filtroCategoria, setFiltroCategoria] = useState('todas');
-  const [busqueda, setBusqueda] = useState('');
-
-  const productosFiltrados = productos
-    .filter(p => filtroCategoria === 'todas' || p.categoria_id === parseInt(filtroCategoria))
-    .filter(p => p.nombre.toLowerCase().includes(busqueda.toLowerCase()));
-
+function ProductosView({ productos, categorias, filtroCategoria, onFiltrarCategoria, busqueda, onBuscar, onCargarMas, onAdd, onEdit, onDelete, onAddToCart }) {
   return (
     <div>
       <div style={{ display: 'f lex', justifyContent: 'space-between', alignItems: 'center', marginBottom: '1.5rem', flexWrap: 'wrap', gap: '1rem' }}>
@@ -689,7 +747,7 @@ function ProductosView({ productos, categorias, onAdd, onEdit, onDelete, onAddTo
           type="text"
           placeholder="Escribe el nombre del producto..."
           value={busqueda}
-          onChange={(e) => setBusqueda(e.target.value)}
+          onChange={(e) => onBuscar(e.target.value)}
           style={{
             width: '100%',
             padding: '0.5rem 1rem',
@@ -706,7 +764,7 @@ function ProductosView({ productos, categorias, onAdd, onEdit, onDelete, onAddTo
         </label>
         <select
           value={filtroCategoria}
-          onChange={(e) => setFiltroCategoria(e.target.value)}
+          onChange={(e) => onFiltrarCategoria(e.target.value)}
           style={{
             padding: '0.5rem 1rem',
             border: '1px solid #d1d5db',
@@ -726,7 +784,7 @@ function ProductosView({ productos, categorias, onAdd, onEdit, onDelete, onAddTo
         gridTemplateColumns: 'repeat(auto-fill, minmax(280px, 1fr))',
         gap: '1.5rem'
       }}>
-        {productosFiltrados.map(producto => (
+        {productos.map(producto => (
           <div key={producto.id} style={{
             backgroundColor: 'white',
             borderRadius: '0.5rem',
@@ -734,8 +792,9 @@ function ProductosView({ productos, categorias, onAdd, onEdit, onDelete, onAddTo
             overflow: 'hidden'
           }}>
             <img
-              src={producto.imagen_url || 'https://via.placeholder.com/300x200?text=Sin+Imagen'}
+              src={urlImagen(producto.imagen_url, 'card')}
               alt={producto.nombre}
+              loading="lazy"
               style={{ width: '100%', height: '200px', objectFit: 'cover' }}
             />
             <div style={{ padding: '1rem' }}>
@@ -811,12 +870,36 @@ function ProductosView({ productos, categorias, onAdd, onEdit, onDelete, onAddTo
           </div>
         ))}
       </div>
+      <BotonCargarMas onClick={onCargarMas} />
+    </div>
+  );
+}
+
+// Botón para pedir la página siguiente de un listado; no se muestra si no quedan más
+function BotonCargarMas({ onClick }) {
+  if (!onClick) return null;
+  return (
+    <div style={{ display: 'flex', justifyContent: 'center', marginTop: '1.5rem' }}>
+      <button
+        onClick={onClick}
+        style={{
+          backgroundColor: 'white',
+          color: '#374151',
+          padding: '0.5rem 1.5rem',
+          borderRadius: '0.5rem',
+          border: '1px solid #d1d5db',
+          cursor: 'pointer',
+          fontWeight: '600'
+        }}
+      >
+        Cargar más
+      </button>
     </div>
   );
 }
 
 // Componente Vista de Clientes
-function ClientesView({ clientes, onAdd, onEdit, onDelete }) {
+function ClientesView({ clientes, onCargarMas, onAdd, onEdit, onDelete }) {
   return (
     <div>
       <div style={{ display: 'flex', justifyContent: 'space-between', alignItems: 'center', marginBottom: '1.5rem', flexWrap: 'wrap', gap: '1rem' }}>
@@ -896,12 +979,13 @@ function ClientesView({ clientes, onAdd, onEdit, onDelete }) {
           </tbody>
         </table>
       </div>
+      <BotonCargarMas onClick={onCargarMas} />
     </div>
   );
 }
 
 // Componente Vista de Pedidos
-function PedidosView({ pedidos, carrito, clientes, onActualizarCantidad, onCrearPedido, onDeletePedido, calcularTotal }) {
+function PedidosView({ pedidos, onCargarMas, carrito, clientes, onActualizarCantidad, onCrearPedido, onDeletePedido, calcularTotal }) {
   return (
     <div style={{ display: 'grid', gridTemplateColumns: '1fr', gap: '1.5rem' }}>
       <div style={{ gridColumn: '1/-1' }}>
@@ -935,9 +1019,11 @@ function PedidosView({ pedidos, carrito, clientes, onActualizarCantidad, onCrear
                         fontSize: '0.875rem',
                         fontWeight: '600',
                         backgroundColor: pedido.estado === 'Completado' ? '#d1fae5' :
-                                       pedido.estado === 'En Proceso' ? '#fef3c7' : '#f3f4f6',
+                                       pedido.estado === 'En Proceso' ? '#fef3c7' :
+                                       pedido.estado === 'Cancelado' ? '#fee2e2' : '#f3f4f6',
                         color: pedido.estado === 'Completado' ? '#065f46' :
-                              pedido.estado === 'En Proceso' ? '#92400e' : '#1f2937'
+                              pedido.estado === 'En Proceso' ? '#92400e' :
+                              pedido.estado === 'Cancelado' ? '#991b1b' : '#1f2937'
                       }}>
                         {pedido.estado}
                       </span>
@@ -946,26 +1032,29 @@ function PedidosView({ pedidos, carrito, clientes, onActualizarCantidad, onCrear
                       </p>
                     </div>
                   </div>
-                  <button
-                    onClick={() => onDeletePedido(pedido.id)}
-                    style={{
-                      backgroundColor: '#ef4444',
-                      color: 'white',
-                      padding: '0.5rem 1rem',
-                      borderRadius: '0.25rem',
-                      border: 'none',
-                      cursor: 'pointer',
-                      display: 'flex',
-                      alignItems: 'center',
-                      gap: '0.5rem'
-                    }}
-                  >
-                    <Trash2 size={16} />
-                    Eliminar Pedido
-                  </button>
+                  {(pedido.estado === 'Pendiente' || pedido.estado === 'En Proceso') && (
+                    <button
+                      onClick={() => onDeletePedido(pedido.id)}
+                      style={{
+                        backgroundColor: '#ef4444',
+                        color: 'white',
+                        padding: '0.5rem 1rem',
+                        borderRadius: '0.25rem',
+                        border: 'none',
+                        cursor: 'pointer',
+                        display: 'flex',
+                        alignItems: 'center',
+                        gap: '0.5rem'
+                      }}
+                    >
+                      <Trash2 size={16} />
+                      Cancelar Pedido
+                    </button>
+                  )}
                 </div>
               ))}
             </div>
+            <BotonCargarMas onClick={onCargarMas} />
           </div>
 
           {/* Carrito */}